@@ -1,9 +1,1833 @@
 import os
+import argparse
+import hashlib
+import concurrent.futures
+import json
+import operator
+import queue
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+
+# Rows fetched above and below the viewport so small scrolls don't go back to pandas
+VIRTUAL_BUFFER_ROWS = 50
+DEFAULT_ROW_HEIGHT = 20
+# How often the Tk loop checks for results posted by the loader thread (ms)
+LOAD_POLL_MS = 100
+# Pause after the last keystroke before the analysis page re-filters (ms)
+FILTER_DEBOUNCE_MS = 150
+# Pause after the last resize event before a chart is re-rendered at the new size (ms)
+CHART_RESIZE_MS = 200
+FILTER_NOTE = "Type value, 'ALL', or a query such as: dept = \"Ops\" and hours > 160"
+
+# Parsed workbooks are cached here as Feather files (pickle when pyarrow isn't installed)
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".excel_viewer_cache")
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = "feather"
+except ImportError:
+    CACHE_FORMAT = "pickle"
+
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WorkbookCache:
+    # On-disk cache of parsed sheets. Entries are keyed by the workbook's content hash and sheet;
+    # (path, size, mtime) is remembered per entry so an unchanged file is found without re-hashing.
+    # The total size is bounded and the least recently used entries are evicted first.
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock = threading.Lock()
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault("entries", {})
+        index.setdefault("stats", {})
+        return index
+
+    def save_index(self, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def stat_key(path, sheet_name):
+        st = os.stat(path)
+        return f"{os.path.abspath(path)}|{sheet_name}|{st.st_size}|{st.st_mtime_ns}"
+
+    @staticmethod
+    def entry_id(content_hash, sheet_name):
+        return hashlib.sha1(f"{content_hash}|{sheet_name}".encode("utf-8")).hexdigest()
+
+    def lookup(self, path, sheet_name):
+        # Returns (entry_id, df or None); df is None on a cache miss
+        with self.lock:
+            index = self.load_index()
+            stat_key = self.stat_key(path, sheet_name)
+            entry_id = index["stats"].get(stat_key)
+            if entry_id is None:
+                entry_id = self.entry_id(file_content_hash(path), sheet_name)
+                index["stats"][stat_key] = entry_id
+
+            entry = index["entries"].get(entry_id)
+            df = None
+            if entry is not None:
+                try:
+                    df = self.read_entry(entry)
+                    entry["last_used"] = time.time()
+                except Exception:
+                    self.remove_entry(index, entry_id)
+            self.save_index(index)
+            return entry_id, df
+
+    def store(self, entry_id, path, sheet_name, df):
+        with self.lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            file_name, fmt = self.write_entry(entry_id, df)
+            index = self.load_index()
+            index["entries"][entry_id] = {
+                "file": file_name,
+                "format": fmt,
+                "bytes": os.path.getsize(os.path.join(self.cache_dir, file_name)),
+                "last_used": time.time(),
+            }
+            index["stats"][self.stat_key(path, sheet_name)] = entry_id
+            self.evict(index)
+            self.save_index(index)
+
+    def read_entry(self, entry):
+        file_path = os.path.join(self.cache_dir, entry["file"])
+        if entry["format"] == "feather":
+            return pd.read_feather(file_path)
+        return pd.read_pickle(file_path)
+
+    def write_entry(self, entry_id, df):
+        if CACHE_FORMAT == "feather":
+            file_name = f"{entry_id}.feather"
+            try:
+                df.to_feather(os.path.join(self.cache_dir, file_name))
+                return file_name, "feather"
+            except Exception:
+                pass  # mixed-type object columns can't go to Arrow; fall back to pickle
+        file_name = f"{entry_id}.pkl"
+        df.to_pickle(os.path.join(self.cache_dir, file_name))
+        return file_name, "pickle"
+
+    def remove_entry(self, index, entry_id):
+        entry = index["entries"].pop(entry_id, None)
+        if entry is not None:
+            try:
+                os.remove(os.path.join(self.cache_dir, entry["file"]))
+            except OSError:
+                pass
+        index["stats"] = {k: v for k, v in index["stats"].items() if v != entry_id}
+
+    def evict(self, index):
+        entries = index["entries"]
+        total = sum(entry["bytes"] for entry in entries.values())
+        for entry_id in sorted(entries, key=lambda k: entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            total -= entries[entry_id]["bytes"]
+            self.remove_entry(index, entry_id)
+
+
+WORKBOOK_CACHE = WorkbookCache()
+
+# Multi-sheet / multi-workbook ingestion
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm", ".xls")
+SOURCE_COLUMN = "Source"
+
+
+def parse_sheet(path, sheet_name):
+    # Top-level so it can run in a process pool worker
+    return pd.read_excel(path, sheet_name=sheet_name)
+
+
+def list_workbooks(folder):
+    # Office lock files ("~$name.xlsx") are skipped
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith("~$"))
+
+
+def list_sheets(path):
+    with pd.ExcelFile(path) as workbook:
+        return list(workbook.sheet_names)
+
+
+def collect_sources(path, all_sheets=False):
+    # Expands a workbook or a folder of workbooks into (path, sheet) pairs
+    paths = list_workbooks(path) if os.path.isdir(path) else [path]
+    sources = []
+    for workbook_path in paths:
+        if all_sheets:
+            sources.extend((workbook_path, sheet) for sheet in list_sheets(workbook_path))
+        else:
+            sources.append((workbook_path, 0))
+    return sources
+
+
+def source_label(path, sheet_name):
+    name = os.path.basename(path)
+    return name if sheet_name == 0 else f"{name} / {sheet_name}"
+
+
+def ingest_workbooks(sources, cancel_event=None, on_progress=None, max_workers=None):
+    # Reads every (path, sheet) source and concatenates them into one DataFrame with a Source column.
+    # Cached sheets are read here; only the misses are parsed, in parallel across a process pool.
+    # The cache is only touched from this process so concurrent workers can't clobber its index.
+    # Returns None if cancel_event is set before all sources are read.
+    frames = {}
+    misses = {}
+    for source in sources:
+        try:
+            entry_id, df = WORKBOOK_CACHE.lookup(*source)
+        except OSError:
+            entry_id, df = None, None
+        if df is not None:
+            frames[source] = df
+        else:
+            misses[source] = entry_id
+
+    def finish(source, df):
+        frames[source] = df
+        if misses[source] is not None:
+            try:
+                WORKBOOK_CACHE.store(misses[source], source[0], source[1], df)
+            except OSError:
+                pass
+        if on_progress is not None:
+            on_progress(len(frames), len(sources))
+
+    if on_progress is not None:
+        on_progress(len(frames), len(sources))
+
+    if len(misses) == 1:
+        source = next(iter(misses))
+        finish(source, parse_sheet(*source))
+    elif misses:
+        workers = min(len(misses), max_workers or os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {pool.submit(parse_sheet, *source): source for source in misses}
+            while pending:
+                done, _ = concurrent.futures.wait(pending, timeout=0.2,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                if cancel_event is not None and cancel_event.is_set():
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    return None
+                for future in done:
+                    finish(pending.pop(future), future.result())
+
+    if cancel_event is not None and cancel_event.is_set():
+        return None
+
+    tagged = []
+    for source in sources:
+        df = frames[source]
+        tagged.append(df.assign(**{SOURCE_COLUMN: source_label(*source)}))
+    df = pd.concat(tagged, ignore_index=True)
+    return df[[SOURCE_COLUMN] + [col for col in df.columns if col != SOURCE_COLUMN]]
+
+
+# Text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def optimize_dtypes(df):
+    # Returns a memory-compact copy of df and a per-column report of (dtype before, dtype after,
+    # bytes before, bytes after). Repeated strings become categoricals; numerics are downcast only
+    # when every value survives the round trip.
+    before = df.memory_usage(deep=True, index=False)
+    optimized = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series.dtype):
+            optimized[col] = series
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            downcast = "unsigned" if len(series) and series.min() >= 0 else "integer"
+            optimized[col] = pd.to_numeric(series, downcast=downcast)
+        elif pd.api.types.is_float_dtype(series.dtype):
+            as_float32 = series.astype(np.float32)
+            if np.array_equal(as_float32.to_numpy(np.float64), series.to_numpy(np.float64), equal_nan=True):
+                optimized[col] = as_float32
+            else:
+                optimized[col] = series
+        elif series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+            unique = series.nunique(dropna=True)
+            if len(series) and unique <= CATEGORY_MAX_UNIQUE_RATIO * len(series):
+                optimized[col] = series.astype("category")
+            else:
+                optimized[col] = series
+        else:
+            optimized[col] = series
+
+    result = pd.DataFrame(optimized, index=df.index)
+    after = result.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        "dtype_before": df.dtypes.astype(str),
+        "dtype_after": result.dtypes.astype(str),
+        "bytes_before": before,
+        "bytes_after": after,
+    })
+    return result, report
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:,.1f} {unit}"
+        size /= 1024
+
+
+# Columns with more distinct values than this get a trigram index for substring search
+TRIGRAM_MIN_VALUES = 5000
+# Above this many matching values, rows are gathered with one vectorized pass over the codes
+GATHER_MAX_VALUES = 1000
+
+
+class ColumnSearchIndex:
+    # Search structure for one column, built once per loaded dataset:
+    # - the column factorized into codes and its distinct values, lowercased as strings
+    # - rows grouped by value (a stable argsort of the codes) for value -> row positions
+    # - a trigram inverted index over the distinct values, built on first use
+    # Matching happens on the distinct values, so a filter costs roughly the number of
+    # distinct values plus the number of matching rows rather than a pass over every row.
+    def __init__(self, series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        self.codes = codes
+        self.values_lower = [str(value).lower() for value in uniques]
+
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        missing = len(codes) - int(counts.sum())
+        # Missing values have code -1 and sort first; they never match
+        self.order = np.argsort(codes, kind="stable")[missing:]
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.exact = None
+        self.trigrams = None
+
+    def rows_for(self, value_ids):
+        # Sorted row positions of every row holding one of the given distinct values
+        value_ids = np.asarray(value_ids, dtype=np.intp)
+        if len(value_ids) == 0:
+            return np.empty(0, dtype=np.intp)
+        if len(value_ids) > GATHER_MAX_VALUES:
+            hit = np.zeros(len(self.values_lower) + 1, dtype=bool)
+            hit[value_ids] = True
+            return np.flatnonzero(hit[self.codes])
+        rows = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in value_ids])
+        rows.sort()
+        return rows
+
+    def equals(self, value):
+        # Case-insensitive exact match
+        if self.exact is None:
+            self.exact = {}
+            for i, text in enumerate(self.values_lower):
+                self.exact.setdefault(text, []).append(i)
+        return self.rows_for(self.exact.get(str(value).lower(), []))
+
+    def contains(self, value):
+        # Case-insensitive substring match
+        return self.rows_for(self.matching_values(value))
+
+    def matching_values(self, value, within=None):
+        # Ids of the distinct values containing value; within restricts the scan to a previous
+        # result, which is valid whenever the new needle contains the previous one
+        needle = str(value).lower()
+        if within is not None:
+            candidates = within
+        elif self.uses_trigrams(needle):
+            candidates = self.trigram_candidates(needle)
+        else:
+            candidates = range(len(self.values_lower))
+        return [i for i in candidates if needle in self.values_lower[i]]
+
+    def uses_trigrams(self, needle):
+        return len(needle) >= 3 and len(self.values_lower) > TRIGRAM_MIN_VALUES
+
+    def is_ready_for(self, needle):
+        # False when answering needle would first have to build the trigram index
+        return self.trigrams is not None or not self.uses_trigrams(needle)
+
+    def build_trigrams(self):
+        if self.trigrams is not None:
+            return
+        postings = {}
+        for i, text in enumerate(self.values_lower):
+            for gram in {text[j:j + 3] for j in range(len(text) - 2)}:
+                postings.setdefault(gram, []).append(i)
+        self.trigrams = {gram: np.array(ids, dtype=np.intp) for gram, ids in postings.items()}
+
+    def trigram_candidates(self, needle):
+        self.build_trigrams()
+        grams = {needle[j:j + 3] for j in range(len(needle) - 2)}
+        lists = sorted((self.trigrams.get(gram) for gram in grams), key=lambda ids: 0 if ids is None else len(ids))
+        if lists[0] is None:
+            return []
+        candidates = lists[0]
+        for ids in lists[1:]:
+            candidates = np.intersect1d(candidates, ids, assume_unique=True)
+        return candidates.tolist()
+
+
+# Memoized results of analysis, chart and salary computations
+RESULT_CACHE_MAX_ENTRIES = 256
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def dataset_fingerprint(df):
+    # Content hash of a loaded DataFrame; a reload only counts as new data when this changes
+    digest = hashlib.sha1()
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def estimate_size(value):
+    # deep=True counts the Python objects behind object/str columns, not just their pointers
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes + (8 * value.size if value.dtype == object else 0)
+    if isinstance(value, (tuple, list)):
+        return sum(estimate_size(item) for item in value)
+    return 64
+
+
+class ResultCache:
+    # LRU memo keyed by (dataset version, operation, parameters), bounded by entry count and by
+    # an estimate of the bytes held. Entries for older dataset versions simply age out.
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+
+    def get_or_compute(self, version, operation, params, compute):
+        key = (version, operation, params)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry[0]
+
+        value = compute()
+        size = estimate_size(value)
+        if size <= self.max_bytes:
+            self.entries[key] = (value, size)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+
+# Compound filter queries, e.g.  dept = "Ops" and hours > 160
+QUERY_HINT = re.compile(r"[=<>]|\s(?:in|contains)[\s(]", re.IGNORECASE)
+QUERY_TOKEN = re.compile(r"""\s*(?:
+    (?P<date>\d{4}-\d{2}-\d{2}(?:T\d{2}:\d{2}(?::\d{2})?)?(?![\w.:-]))
+    |(?P<number>-?\d+(?:\.\d+)?(?![\w.]))
+    |(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    |(?P<column>`[^`]+`)
+    |(?P<op><=|>=|!=|==|=|<|>|\(|\)|,)
+    |(?P<word>[^\s=<>!(),"'`]+)
+)""", re.VERBOSE)
+QUERY_KEYWORDS = {"and", "or", "not", "in", "contains", "true", "false"}
+COMPARISONS = {
+    "=": operator.eq, "==": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+}
+
+
+class QueryError(ValueError):
+    pass
+
+
+def tokenize_query(text):
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = QUERY_TOKEN.match(text, pos)
+        if match is None:
+            raise QueryError(f"Unexpected character at position {pos + 1}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        elif kind == "column":
+            value = value[1:-1]
+        elif kind == "word" and value.lower() in QUERY_KEYWORDS:
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+        pos = match.end()
+    return tokens
+
+
+class QueryParser:
+    # Recursive-descent parser producing a tuple AST:
+    #   ("or", a, b) | ("and", a, b) | ("not", a)
+    #   ("cmp", column, op, value) | ("in", column, values) | ("contains", column, value)
+    # Column names are resolved case-insensitively, so repr(ast) is a normalized cache key.
+    def __init__(self, text, columns):
+        self.tokens = tokenize_query(text)
+        self.pos = 0
+        self.columns = {str(col).lower(): col for col in columns}
+
+    def parse(self):
+        if not self.tokens:
+            raise QueryError("Empty query")
+        node = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise QueryError(f"Unexpected '{self.tokens[self.pos][1]}'")
+        return node
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, value=None):
+        token_kind, token_value = self.peek()
+        if token_kind is None:
+            raise QueryError("Query is incomplete")
+        if (kind is not None and token_kind != kind) or (value is not None and token_value != value):
+            raise QueryError(f"Unexpected '{token_value}'")
+        self.pos += 1
+        return token_kind, token_value
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == ("keyword", "or"):
+            self.take()
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while self.peek() == ("keyword", "and"):
+            self.take()
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if self.peek() == ("keyword", "not"):
+            self.take()
+            return ("not", self.parse_not())
+        if self.peek() == ("op", "("):
+            self.take()
+            node = self.parse_or()
+            self.take("op", ")")
+            return node
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        kind, name = self.take()
+        if kind not in ("word", "column", "string"):
+            raise QueryError(f"Expected a column name, got '{name}'")
+        column = self.columns.get(str(name).lower())
+        if column is None:
+            raise QueryError(f"Unknown column '{name}'")
+
+        kind, op = self.take()
+        if kind == "op" and op in COMPARISONS:
+            return ("cmp", column, "=" if op == "==" else op, self.parse_value())
+        if (kind, op) == ("keyword", "contains"):
+            return ("contains", column, str(self.parse_value()))
+        if (kind, op) == ("keyword", "in"):
+            self.take("op", "(")
+            values = [self.parse_value()]
+            while self.peek() == ("op", ","):
+                self.take()
+                values.append(self.parse_value())
+            self.take("op", ")")
+            return ("in", column, tuple(values))
+        raise QueryError(f"Expected a comparison after '{column}', got '{op}'")
+
+    def parse_value(self):
+        # Numbers and dates keep their text; compare() converts them per column type, so a text
+        # column of codes still matches "1001" rather than "1001.0"
+        kind, value = self.take()
+        if kind in ("number", "date", "string", "word"):
+            return value
+        if kind == "keyword" and value in ("true", "false"):
+            return value == "true"
+        raise QueryError(f"Expected a value, got '{value}'")
+
+
+def parse_query(text, columns):
+    return QueryParser(text, columns).parse()
+
+
+def looks_like_query(text):
+    return QUERY_HINT.search(text) is not None
+
+
+QUERY_FIRST_WORD = re.compile(
+    r"""\s*(?:(?:not\b|\()\s*)*(?:`([^`]+)`|"([^"]*)"|'([^']*)'|([^\s=<>!(),"'`]+))""",
+    re.IGNORECASE,
+)
+
+
+def starts_with_column(text, columns):
+    # True when the text opens (after any "not" / "(") with a known column name, i.e. a failed
+    # parse is a broken query rather than a plain search such as "Manager in training".
+    # Only the first word is read, so a half-typed query like: dept = "O  still counts
+    match = QUERY_FIRST_WORD.match(text)
+    if match is None:
+        return False
+    name = next(group for group in match.groups() if group is not None)
+    return name.lower() in {str(col).lower() for col in columns}
+
+
+class QueryEngine:
+    # Evaluates parsed queries as vectorized boolean masks over the whole DataFrame and caches
+    # the matching row positions per normalized query (repr of the AST) in the result cache.
+    # Text equality and substring tests go through the column search indexes; numeric and date
+    # comparisons run as NumPy/pandas ops.
+    def __init__(self, df, get_index, cache, version):
+        self.df = df
+        self.get_index = get_index
+        self.cache = cache
+        self.version = version
+
+    def rows(self, ast):
+        return self.cache.get_or_compute(self.version, "query", repr(ast), lambda: np.flatnonzero(self.mask(ast)))
+
+    def mask(self, node):
+        kind = node[0]
+        if kind == "and":
+            return self.mask(node[1]) & self.mask(node[2])
+        if kind == "or":
+            return self.mask(node[1]) | self.mask(node[2])
+        if kind == "not":
+            return ~self.mask(node[1])
+        if kind == "contains":
+            return self.rows_to_mask(self.get_index(node[1]).contains(node[2]))
+        if kind == "in":
+            column, values = node[1], node[2]
+            mask = np.zeros(len(self.df), dtype=bool)
+            for value in values:
+                mask |= self.compare(column, "=", value)
+            return mask
+        return self.compare(node[1], node[2], node[3])
+
+    def rows_to_mask(self, rows):
+        mask = np.zeros(len(self.df), dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def compare(self, column, op, value):
+        series = self.df[column]
+        dtype = series.dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            value = value if isinstance(value, bool) else str(value).lower() in ("true", "1", "yes")
+        elif pd.api.types.is_numeric_dtype(dtype):
+            try:
+                value = float(value)
+            except ValueError:
+                raise QueryError(f"'{column}' is numeric; '{value}' is not a number")
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            try:
+                value = pd.Timestamp(str(value))
+            except ValueError:
+                raise QueryError(f"'{column}' holds dates; '{value}' is not a date")
+        elif op in ("=", "!="):
+            # Text equality is case-insensitive, like the substring filter
+            mask = self.rows_to_mask(self.get_index(column).equals(value))
+            return mask if op == "=" else ~mask
+        else:
+            # Ordering on a text column: numerically when the value is a number (so "9" < "10"),
+            # otherwise by text
+            try:
+                number = None if isinstance(value, bool) else float(value)
+            except ValueError:
+                number = None
+            if number is not None:
+                series = pd.to_numeric(series.astype(object), errors="coerce")
+                value = number
+            else:
+                series = series.astype(str)
+                value = str(value)
+        result = COMPARISONS[op](series, value)
+        return np.asarray(result.fillna(False), dtype=bool)
+
+
+AGGREGATES = ["sum", "mean", "min", "max", "count", "median"]
+
+
+def factorize_column(series):
+    # (codes, uniques) with missing values as code -1
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    return codes.astype(np.intp, copy=False), uniques
+
+
+class GroupKeys:
+    # Dense group ids for one or more key columns, built from cached per-column factorizations.
+    # Aggregations reuse these ids with bincount / reduceat, so changing the metric or adding an
+    # aggregate never hashes the key columns again. Missing keys form their own group; with no key
+    # columns every row falls into a single group.
+    def __init__(self, columns, factorizations, row_count):
+        self.columns = list(columns)
+        group_ids = np.zeros(row_count, dtype=np.intp)
+        for codes, uniques in factorizations:
+            # Mixed-radix combine, re-densified after each column so the ids never overflow
+            combined = group_ids * (len(uniques) + 1) + (codes + 1)
+            group_ids, _ = pd.factorize(combined)
+        self.group_ids = group_ids.astype(np.intp, copy=False)
+        self.group_count = int(group_ids.max()) + 1 if len(group_ids) else 0
+
+        # One representative row per group gives the key labels
+        _, first_rows = np.unique(self.group_ids, return_index=True)
+        self.labels = {}
+        for col, (codes, uniques) in zip(self.columns, factorizations):
+            label_codes = codes[first_rows]
+            labels = np.asarray(uniques, dtype=object)[np.maximum(label_codes, 0)]
+            labels[label_codes < 0] = None
+            self.labels[col] = labels
+        self.order = None
+
+    def sorted_order(self):
+        # Row positions ordered by group id, computed once and reused for min/max/median
+        if self.order is None:
+            self.order = np.argsort(self.group_ids, kind="stable")
+        return self.order
+
+    def aggregate(self, values, funcs, rows=None):
+        # values: float64 array aligned with the base rows (NaN is skipped, as pandas does)
+        # rows: optional row positions of the active filter
+        # Returns a DataFrame with the key columns and one column per aggregate
+        ids = self.group_ids
+        selected = np.ones(len(ids), dtype=bool)
+        if rows is not None:
+            selected[:] = False
+            selected[rows] = True
+        valid = selected & ~np.isnan(values)
+        present = np.bincount(ids[selected], minlength=self.group_count) > 0
+
+        counts = np.bincount(ids[valid], minlength=self.group_count)
+        result = {col: labels for col, labels in self.labels.items()}
+        sums = None
+        ordered = None
+        for func in funcs:
+            if func == "count":
+                out = counts
+            elif func in ("sum", "mean"):
+                if sums is None:
+                    sums = np.bincount(ids[valid], weights=values[valid], minlength=self.group_count)
+                if func == "sum":
+                    out = sums
+                else:
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        out = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+            else:
+                if ordered is None:
+                    order = self.sorted_order()
+                    order = order[valid[order]]
+                    ordered = (ids[order], values[order])
+                out = self.ordered_aggregate(func, *ordered, counts)
+            result[func] = out
+        return pd.DataFrame(result)[present].reset_index(drop=True)
+
+    def ordered_aggregate(self, func, sorted_ids, sorted_values, counts):
+        out = np.full(self.group_count, np.nan)
+        if not len(sorted_ids):
+            return out
+        starts = np.searchsorted(sorted_ids, np.arange(self.group_count))
+        nonempty = counts > 0
+        if func == "min":
+            out[nonempty] = np.minimum.reduceat(sorted_values, starts[nonempty])
+        elif func == "max":
+            out[nonempty] = np.maximum.reduceat(sorted_values, starts[nonempty])
+        else:  # median: sort values inside each group segment, then take the middle element(s)
+            within = np.lexsort((sorted_values, sorted_ids))
+            segment_values = sorted_values[within]
+            lower = starts + (counts - 1) // 2
+            upper = starts + counts // 2
+            out[nonempty] = (segment_values[lower[nonempty]] + segment_values[upper[nonempty]]) / 2
+        return out
+
+
+# The pivot cube keeps decomposable partial aggregates so any coarser pivot can be derived from it
+PIVOT_AGGREGATES = ["sum", "mean", "min", "max", "count"]
+CUBE_PARTIALS = ["sum", "count", "min", "max"]
+
+
+def pivot_from_cube(cube, row_keys, col_keys, func):
+    # Re-aggregates the cube's partials over the requested keys, then spreads col_keys across
+    # the columns. Only the cube's rows (one per key combination) are touched.
+    keys = list(row_keys) + list(col_keys)
+    if keys:
+        grouped = cube.groupby(keys, dropna=False, observed=True, sort=True).agg(
+            sum=("sum", "sum"), count=("count", "sum"), min=("min", "min"), max=("max", "max"))
+    else:
+        grouped = pd.DataFrame({"sum": [cube["sum"].sum()], "count": [cube["count"].sum()],
+                                "min": [cube["min"].min()], "max": [cube["max"].max()]},
+                               index=pd.Index(["All"], name="Rows"))
+    if func == "mean":
+        values = grouped["sum"] / grouped["count"].where(grouped["count"] > 0)
+    else:
+        values = grouped[func]
+
+    if not col_keys:
+        table = values.to_frame(func)
+    elif not row_keys:
+        table = values.to_frame(func).T
+        table.index = pd.Index([func], name="Rows")
+    else:
+        table = values.unstack(list(col_keys))
+    if isinstance(table.columns, pd.MultiIndex):
+        table.columns = [" / ".join(str(part) for part in col) for col in table.columns]
+    else:
+        table.columns = [str(col) for col in table.columns]
+    table = table.reset_index()
+    table.columns = [str(col) for col in table.columns]
+    return table
+
+
+# Column profiles
+PROFILE_TOP_VALUES = 3
+PROFILE_HISTOGRAM_BINS = 10
+# Share of non-empty cells that must parse as numbers for a text column to count as numeric
+NUMERIC_MIN_SHARE = 0.95
+SPARK_BARS = "\u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
+
+
+def sparkline(counts):
+    if not len(counts) or counts.max() == 0:
+        return ""
+    levels = np.ceil(counts / counts.max() * (len(SPARK_BARS) - 1)).astype(int)
+    return "".join(SPARK_BARS[level] for level in levels)
+
+
+def profile_column(series):
+    # One factorization gives nulls, distinct count and top values; numeric stats and the
+    # histogram are vectorized NumPy reductions over the same column.
+    # Returns (profile dict, (codes, uniques)) so the factorization can be reused for grouping.
+    codes, uniques = factorize_column(series)
+    valid_codes = codes[codes >= 0]
+    counts = np.bincount(valid_codes, minlength=len(uniques))
+    top = np.argsort(-counts, kind="stable")[:PROFILE_TOP_VALUES] if len(counts) > PROFILE_TOP_VALUES \
+        else np.argsort(-counts, kind="stable")
+    info = {
+        "type": str(series.dtype),
+        "nulls": int(len(codes) - len(valid_codes)),
+        "distinct": int(len(uniques)),
+        "top": ", ".join(f"{uniques[i]} ({counts[i]:,})" for i in top),
+        "numeric": False,
+        "min": None, "max": None, "mean": None, "histogram": "",
+    }
+
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return info, (codes, uniques)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        info["min"], info["max"] = series.min(), series.max()
+        return info, (codes, uniques)
+
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        info["numeric"] = True
+    else:
+        # Text columns that hold numbers (e.g. rates typed as text) still count as numeric
+        values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        non_empty = len(valid_codes)
+        info["numeric"] = non_empty > 0 and np.count_nonzero(~np.isnan(values)) >= NUMERIC_MIN_SHARE * non_empty
+
+    if info["numeric"]:
+        finite = values[np.isfinite(values)]
+        if len(finite):
+            info["min"], info["max"], info["mean"] = finite.min(), finite.max(), finite.mean()
+            info["histogram"] = sparkline(np.histogram(finite, bins=PROFILE_HISTOGRAM_BINS)[0])
+    return info, (codes, uniques)
+
+
+def profile_dataframe(df):
+    # Returns ({column: profile dict}, {column: (codes, uniques)})
+    profiles = {}
+    factorizations = {}
+    for col in df.columns:
+        profiles[col], factorizations[col] = profile_column(df[col])
+    return profiles, factorizations
+
+
+def profile_table(profiles):
+    def fmt(value):
+        if value is None:
+            return ""
+        if isinstance(value, (float, np.floating)):
+            return f"{value:,.4g}"
+        return str(value)
+
+    return pd.DataFrame([{
+        "Column": col,
+        "Type": info["type"] + (" (numeric)" if info["numeric"] and info["type"] in ("object", "str") else ""),
+        "Nulls": f"{info['nulls']:,}",
+        "Distinct": f"{info['distinct']:,}",
+        "Min": fmt(info["min"]),
+        "Max": fmt(info["max"]),
+        "Mean": fmt(info["mean"]),
+        "Top Values": info["top"],
+        "Histogram": info["histogram"],
+    } for col, info in profiles.items()])
+
+
+def salary_inputs(df, work_col, rate_col):
+    # Only the work and rate columns are converted, in float64 so compact float32 inputs don't
+    # cost precision on large amounts. Raises ValueError when either has non-numeric values.
+    work = pd.to_numeric(df[work_col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    rate = pd.to_numeric(df[rate_col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.isnan(work).any() or np.isnan(rate).any():
+        raise ValueError("Work hours and rate columns must contain numeric values.")
+    return work, rate
+
+
+def salary_from_inputs(work, rate, salary_type):
+    if salary_type == "daily":
+        return work * rate
+    elif salary_type == "monthly":
+        return rate.copy()
+    else:  # hourly
+        return work * rate
+
+
+# Working days for proration: Monday to Friday, minus the holidays from the calendar file
+WORKWEEK_MASK = "1111100"
+
+
+def load_holidays(path):
+    # Holiday dates from the first column of a CSV or plain list (one date per line); rows that
+    # aren't dates, such as a header, are skipped
+    column = pd.read_csv(path, header=None, usecols=[0], comment="#", skip_blank_lines=True)[0]
+    dates = pd.to_datetime(column, errors="coerce", format="mixed").dropna()
+    if dates.empty:
+        raise ValueError(f"No dates found in {os.path.basename(path)}")
+    return np.unique(dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]"))
+
+
+def pay_period(text):
+    # First and last day of a "YYYY-MM" pay period
+    try:
+        month = np.datetime64(text.strip(), "M")
+    except ValueError as e:
+        raise ValueError(f"Pay period must look like 2026-01, got {text!r}") from e
+    return month.astype("datetime64[D]"), (month + 1).astype("datetime64[D]") - 1
+
+
+def proration_factors(start, end, period, holidays=None):
+    # Share of the period's working days each employee was employed for, over whole columns with
+    # busday_count. start/end are datetime64 arrays (NaT means open-ended); either may be None.
+    first, last = period
+    calendar = np.busdaycalendar(weekmask=WORKWEEK_MASK, holidays=holidays if holidays is not None else [])
+    period_days = np.busday_count(first, last + 1, busdaycal=calendar)
+    if period_days == 0:
+        raise ValueError("The pay period has no working days.")
+
+    count = len(start if start is not None else end)
+    begin = np.full(count, first)
+    finish = np.full(count, last)
+    if start is not None:
+        start = start.astype("datetime64[D]")
+        begin = np.where(np.isnat(start), first, np.maximum(start, first))
+    if end is not None:
+        end = end.astype("datetime64[D]")
+        finish = np.where(np.isnat(end), last, np.minimum(end, last))
+    worked = np.busday_count(begin, np.maximum(finish + 1, begin), busdaycal=calendar)
+    return worked / period_days
+
+
+def pay_components(work, rate, salary_type, rules=None):
+    # Pay per row as named component arrays ending with "Net". Every step is elementwise, so any
+    # subset of rows can be recomputed on its own.
+    if rules is None:
+        return {"Net": salary_from_inputs(work, rate, salary_type)}
+    return rules.apply(work, rate, salary_type)
+
+
+class SalaryRun:
+    # The last salary calculation, kept with what each stage depends on:
+    #   work/rate values <- dataset version, the work/rate columns and any proration
+    #   pay components   <- work/rate values, salary type and rule set
+    # Another run recomputes only stages whose dependencies changed. When new data changes only
+    # some work/rate values (e.g. a refreshed workbook with one employee's rate edited), only
+    # those rows are recomputed and patched into copies of the previous components.
+    def __init__(self):
+        self.columns = None
+        self.version = None
+        self.method = None
+        self.work = None
+        self.rate = None
+        self.components = None
+        self.revision = 0
+        self.changed_rows = None  # rows recomputed by the last update; None after a full run
+
+    def update(self, df, version, work_col, rate_col, salary_type, rules=None, proration=None):
+        # proration is (key, per-row factors) scaling the rate, e.g. from proration_factors
+        columns = (work_col, rate_col, proration[0] if proration else None)
+        method = (salary_type, rules.key if rules else None)
+        same_inputs = columns == self.columns and version == self.version
+        if same_inputs and method == self.method:
+            self.changed_rows = np.array([], dtype=np.intp)
+            return self.components
+
+        if same_inputs:
+            work, rate = self.work, self.rate
+        else:
+            work, rate = salary_inputs(df, work_col, rate_col)
+            if proration:
+                rate = rate * proration[1]
+
+        changed = None
+        if method == self.method and columns == self.columns and self.work is not None and len(work) == len(self.work):
+            changed = np.flatnonzero((work != self.work) | (rate != self.rate))
+
+        if changed is None:
+            components = pay_components(work, rate, salary_type, rules)
+        else:
+            components = {name: values.copy() for name, values in self.components.items()}
+            if len(changed):
+                patch = pay_components(work[changed], rate[changed], salary_type, rules)
+                for name, values in patch.items():
+                    components[name][changed] = values
+        if changed is None or len(changed):
+            self.revision += 1
+
+        self.columns, self.version, self.method = columns, version, method
+        self.work, self.rate = work, rate
+        self.components = components
+        self.changed_rows = changed
+        return components
+
+
+class RuleError(ValueError):
+    pass
+
+
+# Payroll rules are read from a JSON file such as:
+# {
+#   "overtime": {"applies_to": ["hourly"], "tiers": [{"above": 160, "multiplier": 1.5},
+#                                                    {"above": 200, "multiplier": 2.0}]},
+#   "allowances": [{"name": "Transport", "amount": 150}, {"name": "Meal", "percent": 5}],
+#   "deductions": [{"name": "EPF", "percent": 11, "cap": 500},
+#                  {"name": "Tax", "percent": 8, "min_gross": 4000}],
+#   "rounding": {"decimals": 2, "mode": "nearest"}
+# }
+# Overtime thresholds are in the units of the work column (hours or days). Percent allowances
+# are on base pay plus overtime; percent deductions are on gross pay (after allowances).
+# "nearest" rounds halves up (0.125 -> 0.13) rather than to even, as payslips expect
+ROUNDING_MODES = {"nearest": lambda values: np.floor(values + 0.5), "up": np.ceil, "down": np.floor}
+SALARY_TYPES = ["hourly", "daily", "monthly"]
+
+
+def rule_number(rule, key, default=None, minimum=0.0):
+    value = rule.get(key, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < minimum:
+        raise RuleError(f"'{key}' must be a number of at least {minimum:g}, got {value!r}")
+    return float(value)
+
+
+def rule_section(value, kind, what):
+    # Config sections must have the expected JSON type; anything else is a RuleError, never an
+    # AttributeError / TypeError further down
+    if not isinstance(value, kind):
+        expected = "an object" if kind is dict else "a list"
+        raise RuleError(f"{what} must be {expected}, got {value!r}")
+    return value
+
+
+class PayrollRules:
+    # A rule set compiled once into whole-array steps. apply() runs them over every employee at
+    # once and returns the pay components, ending with Net; there is no per-row Python.
+    def __init__(self, config, name="rules"):
+        if not isinstance(config, dict):
+            raise RuleError("Payroll rules must be a JSON object.")
+        self.name = name
+        self.key = hashlib.sha1(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+        self.overtime = self.compile_overtime(rule_section(config.get("overtime", {}), dict, "'overtime'"))
+        self.allowances = [self.compile_amount(rule, "allowance")
+                           for rule in rule_section(config.get("allowances", []), list, "'allowances'")]
+        self.deductions = [self.compile_amount(rule, "deduction")
+                           for rule in rule_section(config.get("deductions", []), list, "'deductions'")]
+        self.round = self.compile_rounding(rule_section(config.get("rounding", {}), dict, "'rounding'"))
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                config = json.load(f)
+        except json.JSONDecodeError as e:
+            raise RuleError(f"{os.path.basename(path)} is not valid JSON: {e}") from e
+        return cls(config, os.path.basename(path))
+
+    def compile_overtime(self, config):
+        applies_to = rule_section(config.get("applies_to", ["hourly", "daily"]), list, "overtime 'applies_to'")
+        if any(salary_type not in SALARY_TYPES for salary_type in applies_to):
+            raise RuleError(f"overtime 'applies_to' must only list {', '.join(SALARY_TYPES)}")
+        tiers = []
+        for tier in rule_section(config.get("tiers", []), list, "overtime 'tiers'"):
+            rule_section(tier, dict, "an overtime tier")
+            above = rule_number(tier, "above", minimum=0.0)
+            if above is None:
+                raise RuleError(f"overtime tier {tier!r} needs an 'above' threshold")
+            tiers.append((above, rule_number(tier, "multiplier", 1.0)))
+        tiers.sort()
+        # Each tier pays (multiplier - previous multiplier) extra on the units above its threshold,
+        # so a unit in a higher tier collects every step below it
+        steps, previous = [], 1.0
+        for above, multiplier in tiers:
+            steps.append((above, multiplier - previous))
+            previous = multiplier
+        return set(applies_to), steps
+
+    def compile_amount(self, rule, kind):
+        rule_section(rule, dict, f"each {kind}")
+        name = rule.get("name") or kind.title()
+        amount = rule_number(rule, "amount", 0.0)
+        percent = rule_number(rule, "percent", 0.0) / 100
+        cap = rule_number(rule, "cap")
+        min_gross = rule_number(rule, "min_gross")
+        if not amount and not percent:
+            raise RuleError(f"{kind} '{name}' needs an 'amount' or a 'percent'")
+        return name, amount, percent, cap, min_gross
+
+    def compile_rounding(self, config):
+        mode = config.get("mode", "nearest")
+        if mode not in ROUNDING_MODES:
+            raise RuleError(f"rounding 'mode' must be one of {', '.join(ROUNDING_MODES)}")
+        scale = 10 ** int(rule_number(config, "decimals", 2.0))
+        func = ROUNDING_MODES[mode]
+        # Scaled values are first snapped to 6 places so float noise (1.005 * 100 = 100.4999...)
+        # doesn't flip the result
+        return lambda values: func(np.round(values * scale, 6)) / scale
+
+    def evaluate(self, rules, basis, gross):
+        # Sum of fixed + percent-of-basis amounts, each capped and gated on gross pay
+        total = np.zeros_like(basis)
+        for _, amount, percent, cap, min_gross in rules:
+            value = amount + basis * percent
+            if cap is not None:
+                value = np.minimum(value, cap)
+            if min_gross is not None:
+                value = np.where(gross >= min_gross, value, 0.0)
+            total += value
+        return total
+
+    def apply(self, work, rate, salary_type):
+        base = rate.copy() if salary_type == "monthly" else work * rate
+        applies_to, steps = self.overtime
+        overtime = np.zeros_like(base)
+        if salary_type in applies_to:
+            for above, extra in steps:
+                overtime += np.maximum(work - above, 0.0) * rate * extra
+
+        base, overtime = self.round(base), self.round(overtime)
+        earned = base + overtime
+        allowances = self.round(self.evaluate(self.allowances, earned, earned))
+        gross = earned + allowances
+        deductions = self.round(self.evaluate(self.deductions, gross, gross))
+        return {"Base": base, "Overtime": overtime, "Allowances": allowances,
+                "Deductions": deductions, "Net": gross - deductions}
+
+
+# Currencies offered before a rate file adds its own
+DEFAULT_CURRENCIES = ["MYR", "IDR", "USD"]
+
+
+def normalize_currency(value):
+    return str(value).strip().upper()
+
+
+class RateTable:
+    # Exchange rates from a CSV with currency, date and rate columns, where rate is the value of one
+    # unit of the currency in a common base (include the base itself at 1). A rate holds from its
+    # date until the currency's next one. Rows are matched with one searchsorted over sorted
+    # (currency, day) keys, so converting a whole payroll never loops per row.
+    def __init__(self, frame, name="rates"):
+        missing = {"currency", "date", "rate"} - set(frame.columns)
+        if missing:
+            raise ValueError(f"Rate file is missing column(s): {', '.join(sorted(missing))}")
+        currency = frame["currency"].map(normalize_currency)
+        dates = pd.to_datetime(frame["date"], errors="coerce")
+        rate = pd.to_numeric(frame["rate"], errors="coerce")
+        if dates.isna().any() or rate.isna().any() or (rate <= 0).any():
+            raise ValueError("Every rate needs a valid date and a positive rate.")
+
+        self.name = name
+        self.key = dataset_fingerprint(frame)
+        self.currencies = sorted(currency.unique())
+        self.index = {code: i for i, code in enumerate(self.currencies)}
+        codes = currency.map(self.index).to_numpy(dtype=np.int64)
+        days = dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+
+        # Day 0 of each currency's key range sits before its first rate, so earlier rows miss
+        self.first_day = int(days.min()) - 1
+        self.last_day = int(days.max())
+        self.span = self.last_day - self.first_day + 1
+        keys = codes * self.span + (days - self.first_day)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.codes = codes[order]
+        self.rates = rate.to_numpy(dtype=np.float64)[order]
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(pd.read_csv(path), os.path.basename(path))
+
+    def lookup(self, codes, days):
+        # Latest rate on or before each day; NaN for unknown currencies (code -1) or earlier days
+        days = np.clip(days, self.first_day, self.last_day)
+        positions = np.searchsorted(self.keys, codes * self.span + (days - self.first_day), side="right") - 1
+        found = (codes >= 0) & (positions >= 0)
+        positions = np.maximum(positions, 0)
+        found &= self.codes[positions] == codes
+        return np.where(found, self.rates[positions], np.nan)
+
+    def factors(self, codes, uniques, dates, target):
+        # Multiplier per row from its currency (factorized codes/uniques) to target, on each row's
+        # date (datetime64 array; None uses the latest rates). Rows without a rate get NaN.
+        target = normalize_currency(target)
+        labels = [normalize_currency(value) for value in uniques]
+        row_codes = np.array([self.index.get(label, -1) for label in labels] + [-1], dtype=np.int64)[codes]
+        same = np.array([label == target for label in labels] + [False])[codes]
+        if dates is None:
+            days = np.full(len(codes), self.last_day, dtype=np.int64)
+        else:
+            days = dates.astype("datetime64[D]").astype(np.int64)
+            # NaT days fall outside every key range and miss
+            days = np.where(np.isnat(dates), self.first_day, days)
+        target_codes = np.full(len(codes), self.index.get(target, -1), dtype=np.int64)
+        factors = self.lookup(row_codes, days) / self.lookup(target_codes, days)
+        return np.where(same, 1.0, factors)
+
+
+def money_formatter(currency):
+    # Display formatter for FrameView: only the visible rows are formatted, never the whole column
+    def format_values(values):
+        return [f"{currency} {value:,.2f}" if np.isfinite(value) else "" for value in values]
+    return format_values
+
+
+# Slices/bars shown before the remaining groups are folded into "Other"
+PIE_TOP_K = 10
+PIE_MAX_SLICES = 50
+
+# Chart types on the chart page, keyed by the short name used in specs and export file names
+CHART_TYPES = {
+    "pie": "Pie Chart",
+    "bar": "Bar Chart",
+    "stacked": "Stacked Bar Chart",
+    "hist": "Histogram",
+    "box": "Box Plot",
+    "line": "Line Chart",
+}
+CHART_HINTS = {
+    "pie": "Slices: label columns. Size: row count, or sum of the value column.",
+    "bar": "Bars: label columns. Height: row count, or sum of the value column.",
+    "stacked": "Bars: label column 1, stacked by label column 2.",
+    "hist": "Distribution of the value column.",
+    "box": "Value column, one box per label group (top K by rows).",
+    "line": "Value column summed (or rows counted) over a date/number label column 1.",
+}
+# Large inputs are reduced with NumPy before matplotlib sees them
+HISTOGRAM_BINS = 50
+LINE_MAX_POINTS = 2000
+BOX_MAX_FLIERS = 200
+
+
+def top_k_indices(totals, k, positive_only=True):
+    # Largest k entries via argpartition (only the k winners get sorted), plus the count and sum
+    # of the non-empty entries left over
+    groups = np.flatnonzero(totals > 0 if positive_only else totals != 0)
+    if len(groups) > k:
+        top = groups[np.argpartition(-totals[groups], k - 1)[:k]]
+    else:
+        top = groups
+    top = top[np.argsort(-totals[top], kind="stable")]
+    return top, len(groups) - len(top), totals[groups].sum() - totals[top].sum()
+
+
+def group_label(group_keys, group):
+    if not group_keys.columns:
+        return "All Data"
+    return " - ".join(str(group_keys.labels[col][group]) for col in group_keys.columns)
+
+
+def top_k_slices(totals, group_keys, k, positive_only=True):
+    # Top k groups as a labelled Series with the rest summed into a single "Other" entry.
+    # Labels are only formatted for the groups that are drawn.
+    totals = np.asarray(totals, dtype=np.float64)
+    top, rest, rest_total = top_k_indices(totals, k, positive_only)
+    pie_data = pd.Series(totals[top], index=[group_label(group_keys, group) for group in top])
+    if rest:
+        pie_data[f"Other ({rest:,} groups)"] = rest_total
+    return pie_data
+
+
+def top_k_matrix(totals, row_label, col_label, k):
+    # totals[row, col] -> DataFrame of the k largest rows and columns; the rest fold into "Other"
+    row_top, row_rest, _ = top_k_indices(totals.sum(axis=1), k, positive_only=False)
+    col_top, col_rest, _ = top_k_indices(totals.sum(axis=0), k, positive_only=False)
+    row_other = np.setdiff1d(np.arange(totals.shape[0]), row_top)
+    col_other = np.setdiff1d(np.arange(totals.shape[1]), col_top)
+
+    table = pd.DataFrame(totals[np.ix_(row_top, col_top)],
+                         index=[row_label(i) for i in row_top], columns=[col_label(i) for i in col_top])
+    if col_rest:
+        table[f"Other ({col_rest:,})"] = totals[np.ix_(row_top, col_other)].sum(axis=1)
+    if row_rest:
+        other = totals[row_other].sum(axis=0)
+        table.loc[f"Other ({row_rest:,})"] = list(other[col_top]) + ([other[col_other].sum()] if col_rest else [])
+    return table
+
+
+def lttb_indices(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, per bucket, the point
+    # forming the largest triangle with the previous pick and the next bucket's average
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    picked = np.empty(threshold, dtype=np.intp)
+    picked[0] = a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+    picked[-1] = n - 1
+    return picked
+
+
+def line_points(x, y=None, max_points=LINE_MAX_POINTS):
+    # Sums y (or counts rows) per distinct x, sorted by x, then downsamples to max_points with LTTB.
+    # x is datetime64 or numeric; rows with a missing x or y are dropped.
+    is_date = np.issubdtype(x.dtype, np.datetime64)
+    x_num = x.astype("datetime64[ns]").view(np.int64) if is_date else x.astype(np.float64)
+    valid = ~np.isnat(x) if is_date else np.isfinite(x_num)
+    if y is not None:
+        valid &= np.isfinite(y)
+    xs, inverse = np.unique(x_num[valid], return_inverse=True)
+    ys = np.bincount(inverse, weights=None if y is None else y[valid], minlength=len(xs)).astype(np.float64)
+
+    keep = lttb_indices(xs.astype(np.float64), ys, max_points)
+    xs = xs[keep]
+    return (xs.view("datetime64[ns]") if is_date else xs), ys[keep]
+
+
+def box_stats(values, label):
+    # Precomputed matplotlib bxp stats (1.5 IQR whiskers); fliers are thinned to an evenly spaced
+    # sample so a million outliers don't each become a marker
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return None
+    q1, med, q3 = np.percentile(values, [25, 50, 75])
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    inside = values[(values >= low) & (values <= high)]
+    fliers = np.sort(values[(values < low) | (values > high)])
+    if len(fliers) > BOX_MAX_FLIERS:
+        fliers = fliers[np.linspace(0, len(fliers) - 1, BOX_MAX_FLIERS).astype(np.intp)]
+    return {"label": str(label), "med": med, "q1": q1, "q3": q3,
+            "whislo": inside.min(), "whishi": inside.max(), "fliers": fliers}
+
+
+# Chart export: formats offered, default resolution and filename template
+EXPORT_FORMATS = ["png", "svg", "pdf"]
+EXPORT_DPI = 150
+EXPORT_TEMPLATE = "{chart}_{timestamp}"
+# Batch exports over more group values than this ask for confirmation first
+EXPORT_CONFIRM_CHARTS = 100
+
+
+def draw_chart(ax, spec):
+    # spec is (kind, data, title) with data already reduced; shared by the live chart page and
+    # the exporters
+    kind, data, title = spec
+    if kind == "pie":
+        ax.pie(data, labels=data.index, autopct="%1.1f%%", startangle=140, textprops={"fontsize": 8})
+    elif kind == "bar":
+        positions = np.arange(len(data))
+        ax.bar(positions, data.to_numpy())
+        ax.set_xticks(positions, labels=data.index, rotation=45, ha="right", fontsize=8)
+    elif kind == "stacked":
+        positions = np.arange(len(data))
+        bottom = np.zeros(len(data))
+        for col in data.columns:
+            ax.bar(positions, data[col].to_numpy(), bottom=bottom, label=str(col))
+            bottom += data[col].to_numpy()
+        ax.set_xticks(positions, labels=data.index, rotation=45, ha="right", fontsize=8)
+        ax.legend(fontsize=7)
+    elif kind == "hist":
+        counts, edges = data
+        ax.stairs(counts, edges, fill=True)
+    elif kind == "box":
+        ax.bxp(data)
+        ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+    elif kind == "line":
+        x, y = data
+        ax.plot(x, y, linewidth=1)
+    ax.set_title(title)
+
+
+def export_filename(template, fmt, chart, timestamp, group=None):
+    # Fills {chart}, {timestamp} and {group} in the template. Batch exports always carry the group
+    # value so one chart per group never overwrites another.
+    safe_group = "" if group is None else re.sub(r"\s+", "_", str(group))
+    try:
+        name = template.format(chart=chart, timestamp=timestamp, group=safe_group)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"Invalid filename template: {e}") from e
+    if group is not None and "{group}" not in template:
+        name = f"{name}_{safe_group}"
+    name = re.sub(r'[\\/:*?"<>|]+', "_", name).strip(" .") or chart
+    return f"{name}.{fmt}"
+
+
+def unique_path(path, taken):
+    # Appends _2, _3, ... instead of overwriting an earlier export
+    base, ext = os.path.splitext(path)
+    candidate, n = path, 1
+    while candidate in taken or os.path.exists(candidate):
+        n += 1
+        candidate = f"{base}_{n}{ext}"
+    taken.add(candidate)
+    return candidate
+
+
+def render_chart(spec, path, dpi, figsize=(6, 6)):
+    # Renders off-screen on a fresh Figure, so it is safe in worker threads and processes
+    fig = Figure(figsize=figsize, layout="constrained")
+    draw_chart(fig.add_subplot(), spec)
+    fig.savefig(path, dpi=dpi)
+    return path
+
+
+def export_charts(jobs, dpi, max_workers=None):
+    # jobs is a list of (spec, path). A single chart renders in the calling thread; batches are
+    # spread across a process pool since rendering is CPU bound.
+    if len(jobs) <= 1:
+        return [render_chart(spec, path, dpi) for spec, path in jobs]
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_chart, spec, path, dpi) for spec, path in jobs]
+        return [future.result() for future in futures]
+
+
+# Rows per batch handed from the streaming reader to the UI
+STREAM_BATCH_ROWS = 5000
+STREAMABLE_EXTENSIONS = (".xlsx", ".xlsm")
+
+
+def make_column_names(header):
+    # Same naming as pandas: blank headers become "Unnamed: i", duplicates get ".1", ".2", ...
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def iter_xlsx_batches(path, sheet_name=0, batch_rows=STREAM_BATCH_ROWS):
+    # Yields (columns, rows, total_rows) with rows as lists of raw tuples, using openpyxl's
+    # read-only row iterator so the sheet is never fully held in memory as cell objects.
+    # total_rows is the sheet's declared dimension and may be None.
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        total_rows = ws.max_row - 1 if ws.max_row else None
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = make_column_names(header)
+        width = len(columns)
+
+        batch = []
+        for row in rows:
+            if len(row) != width:
+                row = tuple(row[:width]) + (None,) * (width - len(row))
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                yield columns, batch, total_rows
+                batch = []
+        if batch:
+            yield columns, batch, total_rows
+    finally:
+        wb.close()
+
+
+def assemble_rows(columns, rows):
+    # Trailing blank rows are dropped, as pd.read_excel does
+    end = len(rows)
+    while end and all(value is None for value in rows[end - 1]):
+        end -= 1
+    return pd.DataFrame.from_records(rows[:end], columns=columns)
+
+
+def read_workbook(path, sheet_name=0, use_cache=True):
+    if not use_cache:
+        return pd.read_excel(path, sheet_name=sheet_name)
+
+    try:
+        entry_id, df = WORKBOOK_CACHE.lookup(path, sheet_name)
+    except OSError:
+        return pd.read_excel(path, sheet_name=sheet_name)
+    if df is not None:
+        return df
+
+    df = pd.read_excel(path, sheet_name=sheet_name)
+    try:
+        WORKBOOK_CACHE.store(entry_id, path, sheet_name, df)
+    except OSError:
+        pass  # caching is best effort; a read-only home dir shouldn't break loading
+    return df
+
+
+class FrameView:
+    # Read-only selection over a base DataFrame: optional row positions, an optional column
+    # subset and derived side columns (arrays aligned with the base rows). Filters and derived
+    # pages hand these around instead of DataFrame copies; cells are only gathered in fetch().
+    # formatters maps a column to a function turning an array of its values into display text;
+    # it only ever sees the fetched rows, so the underlying data stays numeric.
+    def __init__(self, base, rows=None, columns=None, extra=None, formatters=None):
+        self.base = base
+        self.rows = rows
+        self.base_columns = list(base.columns) if columns is None else list(columns)
+        self.extra = dict(extra or {})
+        self.formatters = dict(formatters or {})
+        self.column_positions = [base.columns.get_loc(col) for col in self.base_columns]
+
+    @property
+    def columns(self):
+        return self.base_columns + list(self.extra)
+
+    def __len__(self):
+        return len(self.base) if self.rows is None else len(self.rows)
+
+    def positions(self, start=0, end=None):
+        # Base row positions for view rows [start, end)
+        end = len(self) if end is None else end
+        if self.rows is None:
+            return np.arange(start, end)
+        return self.rows[start:end]
+
+    def full_column(self, name):
+        # Values of one column for every base row
+        return self.extra[name] if name in self.extra else self.base[name]
+
+    def column(self, name):
+        # Values of one column for the selected rows, without touching the other columns
+        if name in self.extra:
+            values = self.extra[name]
+            return values if self.rows is None else values[self.rows]
+        series = self.base[name]
+        return series if self.rows is None else series.iloc[self.rows]
+
+    def fetch(self, start, end):
+        positions = self.positions(start, end)
+        chunk = self.base.iloc[positions, self.column_positions]
+        formatted = [i for i, col in enumerate(self.base_columns) if col in self.formatters]
+        if formatted:
+            chunk = chunk.copy()
+            for i in formatted:
+                formatter = self.formatters[self.base_columns[i]]
+                chunk.isetitem(i, formatter(chunk.iloc[:, i].to_numpy()))
+        rows = chunk.itertuples(index=False, name=None)
+        if not self.extra:
+            return list(rows)
+        extra_values = []
+        for name, values in self.extra.items():
+            values = np.asarray(values)[positions]
+            extra_values.append(self.formatters[name](values) if name in self.formatters else values)
+        return [row + tuple(extras) for row, extras in zip(rows, zip(*extra_values))]
+
+
+def column_rank(values, ascending=True):
+    # Dense rank (equal values share a rank) in the given direction, with missing values last
+    # either way; mixed-type columns rank by their text
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    try:
+        ranks = series.rank(method="dense", ascending=ascending, na_option="bottom")
+    except TypeError:
+        ranks = series.astype(str).rank(method="dense", ascending=ascending, na_option="bottom")
+    return ranks.to_numpy(dtype=np.int64)
+
+
+def sort_permutation(ranks):
+    # Stable order of all base rows by one or more rank arrays (each already in its direction)
+    if len(ranks) == 1:
+        return np.argsort(ranks[0], kind="stable")
+    return np.lexsort(ranks[::-1])
+
+
+def apply_permutation(perm, rows, total):
+    # Restricts a full-data permutation to a row selection in O(n), without sorting again
+    if rows is None:
+        return perm
+    selected = np.zeros(total, dtype=bool)
+    selected[rows] = True
+    return perm[selected[perm]]
+
+
+def sort_view_rows(view, keys):
+    # Uncached sort of a view; keys is a list of (column, ascending)
+    perm = sort_permutation([column_rank(view.full_column(col), asc) for col, asc in keys])
+    return apply_permutation(perm, view.rows, len(view.base))
+
+
+class VirtualTable:
+    # Treeview front-end that only keeps the rows in the visible viewport as Tk items.
+    # The vertical scrollbar drives an offset into the DataFrame instead of the Treeview.
+    # Clicking a heading sorts by that column (again to reverse); shift-click adds a sort key.
+    # sorter(view, keys) returns the sorted base row positions for a view.
+    def __init__(self, master, buffer_rows=VIRTUAL_BUFFER_ROWS, sorter=sort_view_rows):
+        self.frame = tk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, show="headings")
+        self.v_scroll = ttk.Scrollbar(self.frame, orient="vertical", command=self.on_scroll)
+        self.h_scroll = ttk.Scrollbar(self.frame, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=self.h_scroll.set)
+
+        self.v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+        self.tree.pack(expand=True, fill=tk.BOTH)
+
+        self.buffer_rows = buffer_rows
+        self.row_height = int(ttk.Style().lookup("Treeview", "rowheight") or DEFAULT_ROW_HEIGHT)
+        self.view = None
+        self.source_view = None
+        self.sorter = sorter
+        self.sort_keys = []
+        self.offset = 0
+        self.visible_rows = 1
+        self.block = []
+        self.block_start = 0
+        # Text of the rows currently shown, so a re-render only touches cells that changed
+        self.rendered = []
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_by(3))
+        self.tree.bind("<Prior>", lambda e: self.scroll_by(-self.visible_rows))
+        self.tree.bind("<Next>", lambda e: self.scroll_by(self.visible_rows))
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0))
+        self.tree.bind("<End>", lambda e: self.scroll_to(self.row_count()))
+        self.tree.bind("<Button-1>", self.on_click, add="+")
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def row_count(self):
+        return 0 if self.view is None else len(self.view)
+
+    def set_data(self, view, keep_position=False):
+        # view may be a DataFrame or a FrameView over one
+        if not isinstance(view, FrameView):
+            view = FrameView(view)
+        same_columns = self.view is not None and self.view.columns == view.columns
+
+        # Keep the current sort across new data (e.g. a new filter) when its columns still exist
+        self.source_view = view
+        if self.sort_keys and all(col in view.columns for col, _ in self.sort_keys):
+            view = FrameView(view.base, self.sorter(view, self.sort_keys), view.base_columns, view.extra,
+                             view.formatters)
+        else:
+            self.sort_keys = []
+
+        self.view = view
+        self.block = []
+        self.block_start = 0
+        if not keep_position:
+            self.offset = 0
+        if not same_columns:
+            self.tree.delete(*self.tree.get_children())
+            self.rendered = []
+            self.tree["columns"] = list(view.columns)
+            for col in view.columns:
+                self.tree.column(col, anchor="center", width=150)
+        for col in view.columns:
+            self.tree.heading(col, text=self.heading_text(col))
+        self.render()
+
+    def heading_text(self, column):
+        for i, (col, ascending) in enumerate(self.sort_keys):
+            if col == column:
+                arrow = "\u25b2" if ascending else "\u25bc"
+                return f"{column} {arrow}{i + 1}" if len(self.sort_keys) > 1 else f"{column} {arrow}"
+        return column
+
+    def on_click(self, event):
+        if self.source_view is None or self.tree.identify_region(event.x, event.y) != "heading":
+            return
+        index = int(self.tree.identify_column(event.x)[1:]) - 1
+        columns = self.source_view.columns
+        if 0 <= index < len(columns):
+            self.toggle_sort(columns[index], additive=bool(event.state & 0x0001))
+
+    def toggle_sort(self, column, additive=False):
+        keys = dict(self.sort_keys)
+        if additive and column in keys:
+            self.sort_keys = [(col, not asc if col == column else asc) for col, asc in self.sort_keys]
+        elif additive:
+            self.sort_keys.append((column, True))
+        elif list(keys) == [column]:
+            self.sort_keys = [(column, not keys[column])]
+        else:
+            self.sort_keys = [(column, True)]
+        self.set_data(self.source_view)
+
+    def clear(self):
+        self.view = None
+        self.source_view = None
+        self.block = []
+        self.rendered = []
+        self.tree.delete(*self.tree.get_children())
+        self.tree["columns"] = []
+        self.v_scroll.set(0, 1)
+
+    def fetch(self, start, end):
+        # Serve the viewport from the buffered block, refilling it only when we scroll past its edges
+        block_end = self.block_start + len(self.block)
+        if start < self.block_start or end > block_end:
+            self.block_start = max(0, start - self.buffer_rows)
+            block_end = min(self.row_count(), end + self.buffer_rows)
+            self.block = self.view.fetch(self.block_start, block_end)
+        return self.block[start - self.block_start:end - self.block_start]
+
+    def render(self):
+        if self.view is None:
+            return
+        total = self.row_count()
+        self.offset = max(0, min(self.offset, total - self.visible_rows))
+        end = min(total, self.offset + self.visible_rows)
+        rows = self.fetch(self.offset, end)
+
+        # Reuse the existing Tk items, only updating rows whose text changed, and create/delete
+        # the difference
+        items = self.tree.get_children()
+        rendered = [tuple(str(value) for value in values) for values in rows]
+        for i, values in enumerate(rows):
+            if i >= len(items):
+                self.tree.insert("", tk.END, values=values)
+            elif i >= len(self.rendered) or self.rendered[i] != rendered[i]:
+                self.tree.item(items[i], values=values)
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+        self.rendered = rendered
+
+        if total:
+            self.v_scroll.set(self.offset / total, end / total)
+        else:
+            self.v_scroll.set(0, 1)
+
+    def scroll_to(self, offset):
+        self.offset = int(offset)
+        self.render()
+        return "break"
+
+    def scroll_by(self, rows):
+        return self.scroll_to(self.offset + rows)
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * self.row_count())
+        elif unit == "pages":
+            self.scroll_by(int(amount) * self.visible_rows)
+        else:
+            self.scroll_by(int(amount))
+
+    def on_mousewheel(self, event):
+        return self.scroll_by(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event):
+        # The heading takes roughly one row of height
+        visible = max(1, event.height // self.row_height - 1)
+        if visible != self.visible_rows:
+            self.visible_rows = visible
+            self.render()
+
+
+class ChartPanel:
+    # One long-lived Figure and Tk canvas per chart page. Figures are created without pyplot so
+    # they never pile up in its global registry; each chart clears the figure and draws in place.
+    # Resize events are coalesced so dragging the window edge re-renders once it settles.
+    def __init__(self, master, figsize=(6, 6)):
+        self.figure = Figure(figsize=figsize, layout="constrained")
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.widget = self.canvas.get_tk_widget()
+        self.widget.bind("<Configure>", self.on_resize)
+        self.resize_after_id = None
+        self.pending_size = None
+
+    def pack(self, **kwargs):
+        self.widget.pack(**kwargs)
+
+    def new_axes(self):
+        self.figure.clear()
+        return self.figure.add_subplot()
+
+    def draw(self):
+        self.canvas.draw_idle()
+
+    def on_resize(self, event):
+        self.pending_size = event
+        if self.resize_after_id is not None:
+            self.widget.after_cancel(self.resize_after_id)
+        self.resize_after_id = self.widget.after(CHART_RESIZE_MS, self.apply_resize)
+
+    def apply_resize(self):
+        self.resize_after_id = None
+        if self.pending_size is not None:
+            self.canvas.resize(self.pending_size)
+            self.pending_size = None
+
+    def close(self):
+        if self.resize_after_id is not None:
+            self.widget.after_cancel(self.resize_after_id)
+            self.resize_after_id = None
+        self.figure.clear()
+        self.widget.destroy()
 
 
 class ExcelViewerApp:
@@ -11,15 +1835,58 @@ class ExcelViewerApp:
         self.root = root
         self.root.title("Excel Table Viewer")
         self.root.geometry("1200x700")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.excel_file_path = None
         self.df = None
-        self.filtered_df = None
+        # Row positions of the current analysis filter over self.df (None means every row)
+        self.filter_rows = None
+        self.memory_report = None
+        self.salary_values = None
+        self.salary_run = SalaryRun()
+        # Bumped whenever a load brings in different data; keys the result cache
+        self.dataset_version = 0
+        self.dataset_fingerprint = None
+        self.result_cache = ResultCache()
+        # Identifies the active analysis filter in cache keys (None means every row)
+        self.filter_key = None
+        # Cached key factorizations for the aggregation page, dropped on reload
+        self.key_codes = {}
+        self.group_keys = {}
+        # (dataset version, value column, filter key, key columns, cube) behind the pivot page
+        self.pivot_cube = None
+        # Column profiles of the current dataset, computed in the background after each load
+        self.profiles = None
+        # Per-column ColumnSearchIndex, built on first filter and dropped on reload
+        self.search_indexes = {}
+        self.indexes_building = set()
+        # (column, needle, matching value ids) of the last filter, used to narrow the next one
+        self.last_filter = None
+        self.filter_after_id = None
+        self.query_engine = None
+
+        # Generic background tasks: (on_done, on_error, status, payload) tuples posted by worker threads
+        self.task_queue = queue.Queue()
+        self.pending_tasks = 0
+
+        # Background loading state; results come back through load_queue on the Tk thread
+        self.load_queue = queue.Queue()
+        self.load_generation = 0
+        self.load_cancel_event = None
+        self.stream_batches = []
+        self.stream_displayed_rows = 0
+        # Read every sheet of the workbook(s) instead of only the first one
+        self.all_sheets_var = tk.BooleanVar(value=False)
 
         self.main_frame = tk.Frame(root)
         self.analysis_frame = tk.Frame(root)
         self.pie_chart_frame = tk.Frame(root)
         self.salary_frame = tk.Frame(root)
+        self.aggregate_frame = tk.Frame(root)
+        self.pivot_frame = tk.Frame(root)
+        self.profile_frame = tk.Frame(root)
+        self.page_frames = [self.main_frame, self.analysis_frame, self.pie_chart_frame, self.salary_frame,
+                            self.aggregate_frame, self.pivot_frame, self.profile_frame]
 
         self.result_col_vars = []
 
@@ -27,6 +1894,9 @@ class ExcelViewerApp:
         self.create_analysis_page()
         self.create_pie_chart_page()
         self.create_salary_page()
+        self.create_aggregate_page()
+        self.create_pivot_page()
+        self.create_profile_page()
 
         self.show_main_page()
 
@@ -35,25 +1905,38 @@ class ExcelViewerApp:
         frame.pack(pady=10)
 
         tk.Button(frame, text="Browse File", command=self.browse_file).pack(side=tk.LEFT, padx=5)
+        tk.Button(frame, text="Browse Folder", command=self.browse_folder).pack(side=tk.LEFT, padx=5)
+        tk.Checkbutton(frame, text="All Sheets", variable=self.all_sheets_var).pack(side=tk.LEFT, padx=5)
         tk.Button(frame, text="Refresh Data", command=self.load_excel).pack(side=tk.LEFT, padx=5)
-        tk.Button(frame, text="Analyze", command=self.show_analysis_page).pack(side=tk.LEFT, padx=5)
-        tk.Button(frame, text="Pie Chart", command=self.show_pie_chart_page).pack(side=tk.LEFT, padx=5)
-        tk.Button(frame, text="Salary", command=self.show_salary_page).pack(side=tk.LEFT, padx=5)
+        # Page buttons stay disabled while a streamed load is still assembling the DataFrame
+        self.page_buttons = [
+            tk.Button(frame, text="Analyze", command=self.show_analysis_page),
+            tk.Button(frame, text="Charts", command=self.show_pie_chart_page),
+            tk.Button(frame, text="Salary", command=self.show_salary_page),
+            tk.Button(frame, text="Pivot", command=self.show_pivot_page),
+            tk.Button(frame, text="Profile", command=self.show_profile_page),
+        ]
+        for button in self.page_buttons:
+            button.pack(side=tk.LEFT, padx=5)
+        tk.Button(frame, text="Memory", command=self.show_memory_report).pack(side=tk.LEFT, padx=5)
 
         self.file_label = tk.Label(frame, text="No file selected", fg="blue")
         self.file_label.pack(side=tk.LEFT, padx=10)
 
+        # Shown in place of file_label while a workbook is being read
+        self.load_progress_frame = tk.Frame(frame)
+        self.load_progress = ttk.Progressbar(self.load_progress_frame, mode="indeterminate", length=150)
+        self.load_progress.pack(side=tk.LEFT, padx=5)
+        self.load_progress_label = tk.Label(self.load_progress_frame, text="", fg="gray")
+        self.load_progress_label.pack(side=tk.LEFT, padx=5)
+        tk.Button(self.load_progress_frame, text="Cancel", command=self.cancel_load).pack(side=tk.LEFT, padx=5)
+
         table_frame = tk.Frame(self.main_frame)
         table_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
 
-        self.tree = ttk.Treeview(table_frame, show="headings")
-        v_scroll = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
-        h_scroll = ttk.Scrollbar(table_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scroll.set, xscrollcommand=h_scroll.set)
-
-        v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
-        self.tree.pack(expand=True, fill=tk.BOTH)
+        self.table = VirtualTable(table_frame, sorter=self.sort_rows)
+        self.table.pack(expand=True, fill=tk.BOTH)
+        self.tree = self.table.tree
 
     def create_analysis_page(self):
         top_frame = tk.Frame(self.analysis_frame)
@@ -71,27 +1954,42 @@ class ExcelViewerApp:
         self.filter_entry = tk.Entry(control_frame)
         self.filter_entry.pack(side=tk.LEFT, padx=5)
 
+        # Filter as the user types, debounced so only the settled query runs
+        self.filter_entry.bind("<KeyRelease>", self.schedule_live_filter)
+        self.column_dropdown.bind("<<ComboboxSelected>>", self.schedule_live_filter)
+
         tk.Button(control_frame, text="Filter", command=self.filter_data).pack(side=tk.LEFT, padx=5)
         tk.Button(control_frame, text="Total", command=self.calculate_total).pack(side=tk.LEFT, padx=5)
         tk.Button(control_frame, text="Back", command=self.show_main_page).pack(side=tk.LEFT, padx=5)
 
-        self.filter_note = tk.Label(self.analysis_frame, text="Type value or 'ALL'", fg="gray")
+        self.filter_note = tk.Label(self.analysis_frame, text=FILTER_NOTE, fg="gray")
         self.filter_note.pack()
+        # Live filter feedback (match count, indexing, query errors); the hint above stays put
+        self.filter_status = tk.Label(self.analysis_frame, text="", fg="gray")
+        self.filter_status.pack()
 
         self.analysis_display_frame = tk.Frame(self.analysis_frame)
         self.analysis_display_frame.pack(expand=True, fill=tk.BOTH)
 
-        self.analysis_tree = ttk.Treeview(self.analysis_display_frame, show="headings")
-        self.analysis_tree.pack(side=tk.LEFT, expand=True, fill=tk.BOTH, padx=5)
+        self.analysis_table = VirtualTable(self.analysis_display_frame, sorter=self.sort_rows)
+        self.analysis_table.pack(side=tk.LEFT, expand=True, fill=tk.BOTH, padx=5)
+        self.analysis_tree = self.analysis_table.tree
 
     def create_pie_chart_page(self):
         control_frame = tk.Frame(self.pie_chart_frame)
         control_frame.pack(pady=10)
 
-        tk.Label(control_frame, text="Pie Chart Generator", font=("Arial", 14, "bold")).grid(row=0, columnspan=2, pady=5)
+        tk.Label(control_frame, text="Chart Generator", font=("Arial", 14, "bold")).grid(row=0, columnspan=2, pady=5)
+
+        tk.Label(control_frame, text="Chart Type").grid(row=1, column=0)
+        self.chart_type_var = tk.StringVar(value=CHART_TYPES["pie"])
+        chart_type_dropdown = ttk.Combobox(control_frame, textvariable=self.chart_type_var,
+                                           values=list(CHART_TYPES.values()), state="readonly")
+        chart_type_dropdown.grid(row=1, column=1, padx=5, pady=2)
+        chart_type_dropdown.bind("<<ComboboxSelected>>", lambda e: self.update_chart_hint())
 
-        tk.Label(control_frame, text="Label Column 1").grid(row=1, column=0)
-        tk.Label(control_frame, text="Label Column 2").grid(row=2, column=0)
+        tk.Label(control_frame, text="Label Column 1").grid(row=2, column=0)
+        tk.Label(control_frame, text="Label Column 2").grid(row=3, column=0)
 
         self.col1_var = tk.StringVar()
         self.col2_var = tk.StringVar()
@@ -99,15 +1997,148 @@ class ExcelViewerApp:
         self.col1_dropdown = ttk.Combobox(control_frame, textvariable=self.col1_var, state="readonly")
         self.col2_dropdown = ttk.Combobox(control_frame, textvariable=self.col2_var, state="readonly")
 
-        self.col1_dropdown.grid(row=1, column=1, padx=5, pady=2)
-        self.col2_dropdown.grid(row=2, column=1, padx=5, pady=2)
-
-        tk.Button(control_frame, text="Show Pie Chart", command=self.generate_pie_chart).grid(row=4, columnspan=2, pady=10)
-        tk.Button(control_frame, text="Back", command=self.show_main_page).grid(row=5, columnspan=2, pady=5)
+        self.col1_dropdown.grid(row=2, column=1, padx=5, pady=2)
+        self.col2_dropdown.grid(row=3, column=1, padx=5, pady=2)
+
+        # Empty value column counts rows; otherwise slices and bars are sized by the column's sum
+        tk.Label(control_frame, text="Value Column").grid(row=4, column=0)
+        self.value_col_var = tk.StringVar()
+        self.value_col_dropdown = ttk.Combobox(control_frame, textvariable=self.value_col_var, state="readonly")
+        self.value_col_dropdown.grid(row=4, column=1, padx=5, pady=2)
+
+        tk.Label(control_frame, text="Top K").grid(row=5, column=0)
+        self.top_k_var = tk.IntVar(value=PIE_TOP_K)
+        tk.Spinbox(control_frame, from_=1, to=PIE_MAX_SLICES, textvariable=self.top_k_var, width=5).grid(row=5, column=1, sticky="w", padx=5, pady=2)
+
+        self.chart_hint = tk.Label(control_frame, text=CHART_HINTS["pie"], fg="gray")
+        self.chart_hint.grid(row=6, columnspan=2)
+
+        tk.Button(control_frame, text="Show Chart", command=self.generate_chart).grid(row=7, columnspan=2, pady=10)
+        tk.Button(control_frame, text="Back", command=self.show_main_page).grid(row=8, columnspan=2, pady=5)
+
+        # Export is opt-in and runs in the background; showing a chart never writes a file
+        export_frame = tk.LabelFrame(control_frame, text="Export")
+        export_frame.grid(row=1, column=2, rowspan=8, padx=15, sticky="n")
+
+        tk.Label(export_frame, text="Format").grid(row=0, column=0, sticky="w")
+        self.export_format_var = tk.StringVar(value=EXPORT_FORMATS[0])
+        ttk.Combobox(export_frame, textvariable=self.export_format_var, values=EXPORT_FORMATS,
+                     state="readonly", width=6).grid(row=0, column=1, sticky="w", padx=5, pady=2)
+        tk.Label(export_frame, text="DPI").grid(row=0, column=2, sticky="w")
+        self.export_dpi_var = tk.IntVar(value=EXPORT_DPI)
+        tk.Spinbox(export_frame, from_=50, to=600, increment=50, textvariable=self.export_dpi_var, width=5).grid(row=0, column=3, sticky="w", padx=5)
+
+        tk.Label(export_frame, text="Folder").grid(row=1, column=0, sticky="w")
+        self.export_dir_var = tk.StringVar(value=os.getcwd())
+        tk.Entry(export_frame, textvariable=self.export_dir_var, width=30).grid(row=1, column=1, columnspan=2, padx=5, pady=2)
+        tk.Button(export_frame, text="...", command=self.browse_export_dir).grid(row=1, column=3, sticky="w")
+
+        tk.Label(export_frame, text="File Name").grid(row=2, column=0, sticky="w")
+        self.export_template_var = tk.StringVar(value=EXPORT_TEMPLATE)
+        tk.Entry(export_frame, textvariable=self.export_template_var, width=30).grid(row=2, column=1, columnspan=2, padx=5, pady=2)
+
+        # With a batch column, one chart per value of that column is exported
+        tk.Label(export_frame, text="One Chart Per").grid(row=3, column=0, sticky="w")
+        self.export_batch_var = tk.StringVar()
+        self.export_batch_dropdown = ttk.Combobox(export_frame, textvariable=self.export_batch_var, state="readonly")
+        self.export_batch_dropdown.grid(row=3, column=1, columnspan=2, padx=5, pady=2)
+
+        self.export_button = tk.Button(export_frame, text="Export", command=self.export_chart)
+        self.export_button.grid(row=4, column=0, columnspan=4, pady=5)
+        self.export_status = tk.Label(export_frame, text="Fields: {chart} {timestamp} {group}", fg="gray")
+        self.export_status.grid(row=5, column=0, columnspan=4)
+        self.chart_spec = None
 
-        self.chart_canvas = None
         self.pie_chart_display = tk.Frame(self.pie_chart_frame)
         self.pie_chart_display.pack(expand=True, fill=tk.BOTH)
+        self.chart_panel = ChartPanel(self.pie_chart_display)
+        self.chart_panel.pack(expand=True, fill=tk.BOTH)
+
+    def create_aggregate_page(self):
+        tk.Label(self.aggregate_frame, text="Aggregation", font=("Arial", 14, "bold")).pack(pady=10)
+
+        setting_frame = tk.Frame(self.aggregate_frame)
+        setting_frame.pack(pady=5)
+
+        tk.Label(setting_frame, text="Group By").grid(row=0, column=0, sticky="n")
+        tk.Label(setting_frame, text="Value Column").grid(row=1, column=0)
+        tk.Label(setting_frame, text="Aggregates").grid(row=2, column=0)
+
+        self.group_by_listbox = tk.Listbox(setting_frame, selectmode=tk.MULTIPLE, exportselection=False,
+                                           height=5, width=30)
+        self.group_by_listbox.grid(row=0, column=1, padx=5, pady=2)
+
+        self.agg_value_var = tk.StringVar()
+        self.agg_value_dropdown = ttk.Combobox(setting_frame, textvariable=self.agg_value_var, state="readonly")
+        self.agg_value_dropdown.grid(row=1, column=1, padx=5, pady=2)
+
+        agg_check_frame = tk.Frame(setting_frame)
+        agg_check_frame.grid(row=2, column=1, sticky="w")
+        self.agg_func_vars = {}
+        for func in AGGREGATES:
+            var = tk.BooleanVar(value=func == "sum")
+            tk.Checkbutton(agg_check_frame, text=func, variable=var).pack(side=tk.LEFT)
+            self.agg_func_vars[func] = var
+
+        tk.Button(setting_frame, text="Calculate", command=self.run_aggregation).grid(row=3, columnspan=2, pady=10)
+        tk.Button(setting_frame, text="Back", command=self.show_analysis_page).grid(row=4, columnspan=2, pady=5)
+
+        self.aggregate_note = tk.Label(self.aggregate_frame, text="", fg="gray")
+        self.aggregate_note.pack()
+
+        self.aggregate_table = VirtualTable(self.aggregate_frame)
+        self.aggregate_table.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
+
+    def create_pivot_page(self):
+        tk.Label(self.pivot_frame, text="Pivot Table", font=("Arial", 14, "bold")).pack(pady=10)
+
+        setting_frame = tk.Frame(self.pivot_frame)
+        setting_frame.pack(pady=5)
+
+        tk.Label(setting_frame, text="Rows").grid(row=0, column=0)
+        tk.Label(setting_frame, text="Columns").grid(row=0, column=1)
+
+        self.pivot_rows_listbox = tk.Listbox(setting_frame, selectmode=tk.MULTIPLE, exportselection=False,
+                                             height=5, width=30)
+        self.pivot_rows_listbox.grid(row=1, column=0, padx=5, pady=2)
+        self.pivot_cols_listbox = tk.Listbox(setting_frame, selectmode=tk.MULTIPLE, exportselection=False,
+                                             height=5, width=30)
+        self.pivot_cols_listbox.grid(row=1, column=1, padx=5, pady=2)
+
+        option_frame = tk.Frame(setting_frame)
+        option_frame.grid(row=2, columnspan=2, pady=5)
+
+        tk.Label(option_frame, text="Value Column").pack(side=tk.LEFT)
+        self.pivot_value_var = tk.StringVar()
+        self.pivot_value_dropdown = ttk.Combobox(option_frame, textvariable=self.pivot_value_var, state="readonly")
+        self.pivot_value_dropdown.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(option_frame, text="Aggregate").pack(side=tk.LEFT)
+        self.pivot_func_var = tk.StringVar(value="sum")
+        ttk.Combobox(option_frame, textvariable=self.pivot_func_var, state="readonly", width=8,
+                     values=PIVOT_AGGREGATES).pack(side=tk.LEFT, padx=5)
+
+        button_frame = tk.Frame(setting_frame)
+        button_frame.grid(row=3, columnspan=2, pady=5)
+        tk.Button(button_frame, text="Build Pivot", command=self.build_pivot).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Transpose", command=self.transpose_pivot).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Back", command=self.show_main_page).pack(side=tk.LEFT, padx=5)
+
+        self.pivot_note = tk.Label(self.pivot_frame, text="", fg="gray")
+        self.pivot_note.pack()
+
+        self.pivot_table = VirtualTable(self.pivot_frame)
+        self.pivot_table.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
+
+    def create_profile_page(self):
+        tk.Label(self.profile_frame, text="Column Profile", font=("Arial", 14, "bold")).pack(pady=10)
+        tk.Button(self.profile_frame, text="Back", command=self.show_main_page).pack(pady=5)
+
+        self.profile_note = tk.Label(self.profile_frame, text="", fg="gray")
+        self.profile_note.pack()
+
+        self.profile_table = VirtualTable(self.profile_frame)
+        self.profile_table.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
 
     def add_result_column(self):
         var = tk.StringVar()
@@ -134,6 +2165,7 @@ class ExcelViewerApp:
         tk.Label(setting_frame, text="Rate Column").grid(row=2, column=0)
         tk.Label(setting_frame, text="Currency").grid(row=3, column=0)
         tk.Label(setting_frame, text="Result Columns").grid(row=4, column=0)
+        tk.Label(setting_frame, text="Totals By").grid(row=0, column=3, padx=(15, 0))
 
         self.salary_type_var = tk.StringVar(value="hourly")
         self.work_hours_col_var = tk.StringVar()
@@ -141,7 +2173,7 @@ class ExcelViewerApp:
         self.currency_var = tk.StringVar(value="MYR")
 
         self.salary_type_dropdown = ttk.Combobox(setting_frame, textvariable=self.salary_type_var, state="readonly",
-                                                 values=["hourly", "daily", "monthly"])
+                                                 values=SALARY_TYPES)
         self.salary_type_dropdown.grid(row=0, column=1)
 
         self.work_hours_dropdown = ttk.Combobox(setting_frame, textvariable=self.work_hours_col_var, state="readonly")
@@ -151,9 +2183,68 @@ class ExcelViewerApp:
         self.rate_col_dropdown.grid(row=2, column=1)
 
         self.currency_dropdown = ttk.Combobox(setting_frame, textvariable=self.currency_var, state="readonly",
-                                              values=["MYR", "IDR", "USD"])
+                                              values=DEFAULT_CURRENCIES)
         self.currency_dropdown.grid(row=3, column=1)
 
+        # Optional column (e.g. department) to break the salary totals down by
+        self.salary_group_var = tk.StringVar()
+        self.salary_group_dropdown = ttk.Combobox(setting_frame, textvariable=self.salary_group_var, state="readonly")
+        self.salary_group_dropdown.grid(row=0, column=4)
+
+        # Optional payroll rule file (overtime tiers, allowances, deductions, rounding)
+        tk.Label(setting_frame, text="Payroll Rules").grid(row=1, column=3, padx=(15, 0))
+        rules_frame = tk.Frame(setting_frame)
+        rules_frame.grid(row=1, column=4, sticky="w")
+        self.payroll_rules = None
+        self.rules_label = tk.Label(rules_frame, text="None", fg="gray")
+        self.rules_label.pack(side=tk.LEFT)
+        tk.Button(rules_frame, text="Load...", command=self.load_payroll_rules).pack(side=tk.LEFT, padx=2)
+        tk.Button(rules_frame, text="Clear", command=self.clear_payroll_rules).pack(side=tk.LEFT)
+
+        # Optional conversion: each row's pay currency (and date) is converted into Currency
+        tk.Label(setting_frame, text="Exchange Rates").grid(row=2, column=3, padx=(15, 0))
+        rates_frame = tk.Frame(setting_frame)
+        rates_frame.grid(row=2, column=4, sticky="w")
+        self.rate_table = None
+        self.rates_label = tk.Label(rates_frame, text="None", fg="gray")
+        self.rates_label.pack(side=tk.LEFT)
+        tk.Button(rates_frame, text="Load...", command=self.load_rate_table).pack(side=tk.LEFT, padx=2)
+        tk.Button(rates_frame, text="Clear", command=self.clear_rate_table).pack(side=tk.LEFT)
+
+        tk.Label(setting_frame, text="Pay Currency Column").grid(row=3, column=3, padx=(15, 0))
+        self.pay_currency_col_var = tk.StringVar()
+        self.pay_currency_dropdown = ttk.Combobox(setting_frame, textvariable=self.pay_currency_col_var, state="readonly")
+        self.pay_currency_dropdown.grid(row=3, column=4)
+
+        tk.Label(setting_frame, text="Rate Date Column").grid(row=4, column=3, padx=(15, 0), sticky="n")
+        self.rate_date_col_var = tk.StringVar()
+        self.rate_date_dropdown = ttk.Combobox(setting_frame, textvariable=self.rate_date_col_var, state="readonly")
+        self.rate_date_dropdown.grid(row=4, column=4, sticky="n")
+
+        # Monthly proration by working days between start/end dates within the pay period
+        tk.Label(setting_frame, text="Start Date Column").grid(row=5, column=3, padx=(15, 0))
+        self.start_date_col_var = tk.StringVar()
+        self.start_date_dropdown = ttk.Combobox(setting_frame, textvariable=self.start_date_col_var, state="readonly")
+        self.start_date_dropdown.grid(row=5, column=4)
+
+        tk.Label(setting_frame, text="End Date Column").grid(row=6, column=3, padx=(15, 0))
+        self.end_date_col_var = tk.StringVar()
+        self.end_date_dropdown = ttk.Combobox(setting_frame, textvariable=self.end_date_col_var, state="readonly")
+        self.end_date_dropdown.grid(row=6, column=4)
+
+        tk.Label(setting_frame, text="Pay Period (YYYY-MM)").grid(row=7, column=3, padx=(15, 0))
+        self.pay_period_var = tk.StringVar(value=time.strftime("%Y-%m"))
+        tk.Entry(setting_frame, textvariable=self.pay_period_var, width=10).grid(row=7, column=4, sticky="w")
+
+        tk.Label(setting_frame, text="Holidays").grid(row=8, column=3, padx=(15, 0))
+        holidays_frame = tk.Frame(setting_frame)
+        holidays_frame.grid(row=8, column=4, sticky="w")
+        self.holidays = None
+        self.holidays_label = tk.Label(holidays_frame, text="None", fg="gray")
+        self.holidays_label.pack(side=tk.LEFT)
+        tk.Button(holidays_frame, text="Load...", command=self.load_holidays).pack(side=tk.LEFT, padx=2)
+        tk.Button(holidays_frame, text="Clear", command=self.clear_holidays).pack(side=tk.LEFT)
+
         # Scrollable result column area
         self.result_col_canvas = tk.Canvas(setting_frame, height=100)
         self.result_col_scrollbar = ttk.Scrollbar(setting_frame, orient="vertical",
@@ -181,28 +2272,79 @@ class ExcelViewerApp:
         self.salary_output_frame = tk.Frame(self.salary_frame)
         self.salary_output_frame.pack(expand=True, fill=tk.BOTH)
 
-        self.salary_tree = ttk.Treeview(self.salary_output_frame, show="headings")
-        self.salary_tree.pack(expand=True, fill=tk.BOTH)
+        # Totals sit under the salary table: one summary line and an optional per-group table
+        summary_frame = tk.Frame(self.salary_output_frame)
+        summary_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.salary_summary = tk.Label(summary_frame, text="", font=("Arial", 10, "bold"))
+        self.salary_summary.pack(pady=5)
+        self.salary_group_table = VirtualTable(summary_frame)
+        self.salary_group_table.tree.configure(height=6)
+
+        self.salary_table = VirtualTable(self.salary_output_frame, sorter=self.sort_rows)
+        self.salary_table.pack(expand=True, fill=tk.BOTH)
+        self.salary_tree = self.salary_table.tree
 
         self.result_col_vars = []
         self.result_col_dropdowns = []
         self.add_result_column()  # Add initial dropdown
 
+    def show_frame(self, frame):
+        for page in self.page_frames:
+            if page is not frame:
+                page.pack_forget()
+        frame.pack(expand=True, fill=tk.BOTH)
+
     def show_main_page(self):
-        self.analysis_frame.pack_forget()
-        self.pie_chart_frame.pack_forget()
-        self.salary_frame.pack_forget()
-        self.main_frame.pack(expand=True, fill=tk.BOTH)
+        self.show_frame(self.main_frame)
+
+    def on_close(self):
+        # Stop any running load and release the chart figures before the window goes away
+        if self.load_cancel_event is not None:
+            self.load_cancel_event.set()
+        self.chart_panel.close()
+        self.root.destroy()
 
     def show_analysis_page(self):
         if self.df is None:
             messagebox.showerror("Error", "Please load an Excel file first.")
             return
         self.column_dropdown["values"] = list(self.df.columns)
-        self.main_frame.pack_forget()
-        self.pie_chart_frame.pack_forget()
-        self.salary_frame.pack_forget()
-        self.analysis_frame.pack(expand=True, fill=tk.BOTH)
+        self.show_frame(self.analysis_frame)
+
+    def show_aggregate_page(self):
+        if self.df is None:
+            messagebox.showerror("Error", "Please load an Excel file first.")
+            return
+        cols = list(self.df.columns)
+        self.fill_listbox(self.group_by_listbox, cols)
+        self.agg_value_dropdown["values"] = self.value_columns()
+        self.show_frame(self.aggregate_frame)
+
+    def show_pivot_page(self):
+        if self.df is None:
+            messagebox.showerror("Error", "Please load an Excel file first.")
+            return
+        cols = list(self.df.columns)
+        for listbox in (self.pivot_rows_listbox, self.pivot_cols_listbox):
+            self.fill_listbox(listbox, cols)
+        self.pivot_value_dropdown["values"] = self.value_columns()
+        self.show_frame(self.pivot_frame)
+
+    def fill_listbox(self, listbox, values, selected=None):
+        # Refills a multi-select listbox, keeping the previous selection where it still exists
+        if selected is None:
+            selected = [listbox.get(i) for i in listbox.curselection()]
+        listbox.delete(0, tk.END)
+        for i, value in enumerate(values):
+            listbox.insert(tk.END, value)
+            if value in selected:
+                listbox.selection_set(i)
+
+    def show_profile_page(self):
+        if self.df is None:
+            messagebox.showerror("Error", "Please load an Excel file first.")
+            return
+        self.show_frame(self.profile_frame)
 
     def show_pie_chart_page(self):
         if self.df is None:
@@ -214,30 +2356,31 @@ class ExcelViewerApp:
 
         self.col1_dropdown["values"] = with_empty
         self.col2_dropdown["values"] = with_empty
+        self.value_col_dropdown["values"] = [""] + self.numeric_columns()
+        self.export_batch_dropdown["values"] = with_empty
 
         self.col1_var.set("")
         self.col2_var.set("")
+        self.value_col_var.set("")
+        self.export_batch_var.set("")
 
-        self.main_frame.pack_forget()
-        self.analysis_frame.pack_forget()
-        self.salary_frame.pack_forget()
-        self.pie_chart_frame.pack(expand=True, fill=tk.BOTH)
+        self.show_frame(self.pie_chart_frame)
 
     def show_salary_page(self):
         if self.df is None:
             messagebox.showerror("Error", "Please load an Excel file first.")
             return
         cols = list(self.df.columns)
-        self.work_hours_dropdown["values"] = cols
-        self.rate_col_dropdown["values"] = cols
-        for combo in self.result_col_frame.winfo_children():
-            if isinstance(combo, ttk.Combobox):
-                combo["values"] = cols
+        numeric_cols = self.numeric_columns()
+        self.work_hours_dropdown["values"] = numeric_cols
+        self.rate_col_dropdown["values"] = numeric_cols
+        self.salary_group_dropdown["values"] = [""] + cols
+        self.pay_currency_dropdown["values"] = [""] + cols
+        self.rate_date_dropdown["values"] = [""] + cols
+        self.start_date_dropdown["values"] = [""] + cols
+        self.end_date_dropdown["values"] = [""] + cols
 
-        self.main_frame.pack_forget()
-        self.analysis_frame.pack_forget()
-        self.pie_chart_frame.pack_forget()
-        self.salary_frame.pack(expand=True, fill=tk.BOTH)
+        self.show_frame(self.salary_frame)
 
         # Update dropdown values for each result column
         for dropdown in self.result_col_dropdowns:
@@ -251,38 +2394,350 @@ class ExcelViewerApp:
             self.update_file_label()
             self.load_excel()
 
+    def browse_folder(self):
+        folder_path = filedialog.askdirectory()
+        if folder_path:
+            self.excel_file_path = folder_path
+            self.update_file_label()
+            self.load_excel()
+
     def update_file_label(self):
         if self.excel_file_path:
             file_name = os.path.basename(self.excel_file_path)
-            self.file_label.config(text=f"Selected File: {file_name}", fg="blue")
+            if os.path.isdir(self.excel_file_path):
+                self.file_label.config(text=f"Selected Folder: {file_name}", fg="blue")
+            else:
+                self.file_label.config(text=f"Selected File: {file_name}", fg="blue")
 
     def load_excel(self):
         if not self.excel_file_path or not os.path.exists(self.excel_file_path):
             self.file_label.config(text="Error: No valid file selected", fg="red")
             return
 
-        self.df = pd.read_excel(self.excel_file_path, sheet_name=0)
-        self.update_table(self.df)
+        # Starting a new load supersedes any load still running
+        if self.load_cancel_event is not None:
+            self.load_cancel_event.set()
+        self.load_generation += 1
+        self.load_cancel_event = threading.Event()
+
+        worker = threading.Thread(target=self.read_excel_worker,
+                                  args=(self.load_generation, self.excel_file_path, self.load_cancel_event,
+                                        self.all_sheets_var.get()),
+                                  daemon=True)
+        worker.start()
+
+        self.show_load_progress()
+        self.root.after(LOAD_POLL_MS, self.poll_load_queue, self.load_generation)
+
+    def read_excel_worker(self, generation, path, cancel_event, all_sheets=False):
+        # Runs off the Tk thread; must not touch any widget
+        try:
+            if os.path.isdir(path) or all_sheets:
+                def on_progress(done, total):
+                    self.load_queue.put((generation, "progress", (done, total)))
+
+                df = ingest_workbooks(collect_sources(path, all_sheets), cancel_event, on_progress)
+            elif path.lower().endswith(STREAMABLE_EXTENSIONS):
+                df = self.stream_excel(generation, path, cancel_event)
+            else:
+                df = read_workbook(path, sheet_name=0)
+            if df is not None:
+                df, report = optimize_dtypes(df)
+                df = (df, report, dataset_fingerprint(df))
+            result = ("done", df)
+        except Exception as e:
+            result = ("error", e)
+        if not cancel_event.is_set():
+            self.load_queue.put((generation,) + result)
+
+    def stream_excel(self, generation, path, cancel_event, sheet_name=0):
+        # Serve unchanged workbooks from the cache; otherwise post batches as they are read.
+        # Streamed frames infer dtypes differently from pd.read_excel, so they get their own
+        # cache entries instead of sharing read_workbook's.
+        cache_sheet = f"{sheet_name}|streamed"
+        try:
+            entry_id, df = WORKBOOK_CACHE.lookup(path, cache_sheet)
+        except OSError:
+            entry_id, df = None, None
+        if df is not None:
+            return df
+
+        columns = []
+        rows = []
+        for columns, batch, total_rows in iter_xlsx_batches(path, sheet_name):
+            if cancel_event.is_set():
+                return None
+            rows.extend(batch)
+            self.load_queue.put((generation, "batch", (assemble_rows(columns, batch), len(rows), total_rows)))
+
+        df = assemble_rows(columns, rows)
+        if entry_id is not None:
+            try:
+                WORKBOOK_CACHE.store(entry_id, path, cache_sheet, df)
+            except OSError:
+                pass  # caching is best effort, as in read_workbook
+        return df
+
+    def poll_load_queue(self, generation):
+        if generation != self.load_generation or self.load_cancel_event is None:
+            return  # a newer load has its own poll loop, or this one was cancelled
+
+        while True:
+            try:
+                job_generation, status, payload = self.load_queue.get_nowait()
+            except queue.Empty:
+                break
+            if job_generation != self.load_generation:
+                continue  # result of a cancelled or superseded load
+            if status == "batch":
+                self.show_stream_batch(*payload)
+                continue
+            if status == "progress":
+                self.show_ingest_progress(*payload)
+                continue
+            self.load_cancel_event = None
+            self.hide_load_progress()
+            if status == "error":
+                self.file_label.config(text=f"Error: Failed to read file ({payload})", fg="red")
+                self.restore_stream_table()
+            else:
+                self.update_file_label()
+                self.set_loaded_data(*payload)
+                self.table.set_data(self.df, keep_position=self.stream_displayed_rows > 0)
+            self.reset_stream()
+            return
+
+        self.root.after(LOAD_POLL_MS, self.poll_load_queue, generation)
+
+    def show_stream_batch(self, batch_df, rows_read, total_rows):
+        if not self.stream_batches:
+            for button in self.page_buttons:
+                button.config(state=tk.DISABLED)
+        self.stream_batches.append(batch_df)
+
+        # Re-display only when the row count has doubled so the concat cost stays linear overall
+        if rows_read >= 2 * self.stream_displayed_rows:
+            self.stream_batches = [pd.concat(self.stream_batches, ignore_index=True)]
+            self.table.set_data(self.stream_batches[0], keep_position=self.stream_displayed_rows > 0)
+            self.stream_displayed_rows = rows_read
+
+        if total_rows:
+            self.load_progress.stop()
+            self.load_progress.config(mode="determinate", maximum=total_rows, value=min(rows_read, total_rows))
+            self.load_progress_label.config(text=f"{rows_read:,} / {total_rows:,} rows")
+        else:
+            self.load_progress_label.config(text=f"{rows_read:,} rows")
+
+    def show_ingest_progress(self, sheets_read, total_sheets):
+        self.load_progress.stop()
+        self.load_progress.config(mode="determinate", maximum=max(total_sheets, 1), value=sheets_read)
+        self.load_progress_label.config(text=f"{sheets_read} / {total_sheets} sheets")
+
+    def restore_stream_table(self):
+        # Put back the last complete DataFrame in place of a partial stream
+        if self.stream_displayed_rows:
+            if self.df is not None:
+                self.update_table(self.df)
+            else:
+                self.table.clear()
+
+    def reset_stream(self):
+        self.stream_batches = []
+        self.stream_displayed_rows = 0
+        for button in self.page_buttons:
+            button.config(state=tk.NORMAL)
+
+    def cancel_load(self):
+        if self.load_cancel_event is None:
+            return
+        self.load_cancel_event.set()
+        self.load_cancel_event = None
+        self.hide_load_progress()
+        self.file_label.config(text="Loading cancelled", fg="red")
+
+        self.restore_stream_table()
+        self.reset_stream()
+
+    def show_load_progress(self):
+        self.reset_stream()
+        self.file_label.pack_forget()
+        self.load_progress_label.config(text="")
+        self.load_progress.config(mode="indeterminate", value=0)
+        self.load_progress_frame.pack(side=tk.LEFT, padx=10)
+        self.load_progress.start(10)
+
+    def hide_load_progress(self):
+        self.load_progress.stop()
+        self.load_progress_frame.pack_forget()
+        self.file_label.pack(side=tk.LEFT, padx=10)
+
+    def set_loaded_data(self, df, memory_report, fingerprint):
+        if fingerprint == self.dataset_fingerprint and self.df is not None:
+            return  # same data as before; keep the current frame, indexes and cached results
+
+        had_salary = self.salary_values is not None
+        self.dataset_version += 1
+        self.dataset_fingerprint = fingerprint
+        self.df = df
+        self.memory_report = memory_report
+        self.filter_rows = None
+        self.filter_key = None
+        self.filter_status.config(text="")
+        self.salary_values = None
+        self.key_codes = {}
+        self.group_keys = {}
+        self.search_indexes = {}
+        self.last_filter = None
+        self.query_engine = QueryEngine(df, self.get_search_index, self.result_cache, self.dataset_version)
+        self.profiles = None
+        self.start_profiling()
+
+        # Refreshed data re-runs the last salary calculation; unchanged rows are reused
+        if had_salary and {self.work_hours_col_var.get(), self.rate_col_var.get()} <= set(df.columns):
+            self.calculate_salary()
+
+    def start_profiling(self):
+        df = self.df
+        version = self.dataset_version
+
+        def done(result):
+            if version != self.dataset_version:
+                return  # profiled data has since been replaced
+            self.profiles, factorizations = result
+            # The profiler's factorizations double as group-key encodings
+            for col, codes in factorizations.items():
+                self.key_codes.setdefault(col, codes)
+            self.profile_table.set_data(profile_table(self.profiles))
+            self.profile_note.config(text=f"{len(df.columns)} columns, {len(df):,} rows")
+
+        def failed(error):
+            if version == self.dataset_version:
+                self.profile_note.config(text=f"Profiling failed: {error}", fg="red")
+
+        self.profile_table.clear()
+        self.profile_note.config(text="Profiling...", fg="gray")
+        self.run_in_background(lambda: profile_dataframe(df), done, failed)
+
+    def numeric_columns(self):
+        # Columns suited to the rate/hours/value pickers; falls back to the dtype until the
+        # profile is ready
+        if self.profiles is not None:
+            return [col for col in self.df.columns if self.profiles[col]["numeric"]]
+        return [col for col in self.df.columns
+                if pd.api.types.is_numeric_dtype(self.df[col].dtype)
+                and not pd.api.types.is_bool_dtype(self.df[col].dtype)]
+
+    def value_columns(self):
+        # Numeric columns first; the rest can still be counted
+        numeric_cols = self.numeric_columns()
+        return numeric_cols + [col for col in self.df.columns if col not in numeric_cols]
+
+    def cached(self, operation, params, compute):
+        return self.result_cache.get_or_compute(self.dataset_version, operation, params, compute)
+
+    def sort_rows(self, view, keys):
+        # Sorter for tables over self.df: per-column ranks and full-data permutations are cached
+        # per dataset version, and a filtered view just takes its rows out of the permutation
+        if view.base is not self.df or any(col in view.extra for col, _ in keys):
+            return sort_view_rows(view, keys)
+
+        def permutation():
+            ranks = [self.cached("rank", (col, asc), lambda col=col, asc=asc: column_rank(self.df[col], asc))
+                     for col, asc in keys]
+            return sort_permutation(ranks)
+
+        perm = self.cached("sort", tuple(keys), permutation)
+        return apply_permutation(perm, view.rows, len(self.df))
+
+    def run_in_background(self, func, on_done, on_error=None):
+        # Runs func on a worker thread and calls on_done(result) / on_error(exc) on the Tk thread
+        def worker():
+            try:
+                result = ("done", func())
+            except Exception as e:
+                result = ("error", e)
+            self.task_queue.put((on_done, on_error) + result)
+
+        threading.Thread(target=worker, daemon=True).start()
+        self.pending_tasks += 1
+        if self.pending_tasks == 1:
+            self.root.after(LOAD_POLL_MS, self.poll_task_queue)
+
+    def poll_task_queue(self):
+        while True:
+            try:
+                on_done, on_error, status, payload = self.task_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.pending_tasks -= 1
+            if status == "done":
+                on_done(payload)
+            elif on_error is not None:
+                on_error(payload)
+        if self.pending_tasks:
+            self.root.after(LOAD_POLL_MS, self.poll_task_queue)
+
+    def build_search_index_async(self, column):
+        if column in self.indexes_building:
+            return
+        self.indexes_building.add(column)
+        df = self.df
+        index = self.search_indexes.get(column)
+
+        def build():
+            built = index if index is not None else ColumnSearchIndex(df[column])
+            built.build_trigrams()
+            return built
+
+        def done(built):
+            self.indexes_building.discard(column)
+            if df is self.df:  # drop indexes for data that has since been reloaded
+                self.search_indexes[column] = built
+                self.schedule_live_filter()
+
+        def failed(error):
+            self.indexes_building.discard(column)
+
+        self.run_in_background(build, done, failed)
+
+    def get_search_index(self, column):
+        index = self.search_indexes.get(column)
+        if index is None:
+            index = ColumnSearchIndex(self.df[column])
+            self.search_indexes[column] = index
+        return index
+
+    def show_memory_report(self):
+        if self.memory_report is None:
+            messagebox.showerror("Error", "Please load an Excel file first.")
+            return
+
+        report = self.memory_report
+        lines = [f"{col}: {row.dtype_before} -> {row.dtype_after}, "
+                 f"{format_bytes(row.bytes_before)} -> {format_bytes(row.bytes_after)}"
+                 for col, row in report.iterrows()]
+        lines.append("")
+        lines.append(f"Total: {format_bytes(report['bytes_before'].sum())} -> "
+                     f"{format_bytes(report['bytes_after'].sum())}")
+        messagebox.showinfo("Memory Usage", "\n".join(lines))
 
     def update_table(self, df):
-        self.tree.delete(*self.tree.get_children())
-        self.tree["columns"] = list(df.columns)
-        for col in df.columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, anchor="center", width=150)
-        for _, row in df.iterrows():
-            self.tree.insert("", tk.END, values=list(row))
+        self.table.set_data(df)
 
     def update_analysis_table(self, df):
-        self.analysis_tree.delete(*self.analysis_tree.get_children())
-        self.analysis_tree["columns"] = list(df.columns)
-        for col in df.columns:
-            self.analysis_tree.heading(col, text=col)
-            self.analysis_tree.column(col, anchor="center", width=150)
-        for _, row in df.iterrows():
-            self.analysis_tree.insert("", tk.END, values=list(row))
-
-    def filter_data(self):
+        self.analysis_table.set_data(df)
+
+    def schedule_live_filter(self, event=None):
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(FILTER_DEBOUNCE_MS, self.run_live_filter)
+
+    def run_live_filter(self):
+        self.filter_after_id = None
+        if self.df is not None:
+            self.filter_data(live=True)
+
+    def filter_data(self, live=False):
         if self.df is None:
             messagebox.showerror("Error", "No data loaded.")
             return
@@ -290,23 +2745,69 @@ class ExcelViewerApp:
         column = self.column_var.get()
         value = self.filter_entry.get().strip()
 
-        if not column:
-            messagebox.showerror("Error", "Please select a column.")
+        # Compound queries name their own columns, so no column needs to be selected. Text that
+        # only looks like a query ("a=b", "Manager in training") falls back to a substring search.
+        ast = None
+        if value.lower() != "all" and looks_like_query(value):
+            try:
+                ast = parse_query(value, self.df.columns)
+                rows = self.query_engine.rows(ast)
+            except QueryError as e:
+                if starts_with_column(value, self.df.columns):
+                    if live:
+                        self.filter_status.config(text=f"Query: {e}")
+                    else:
+                        messagebox.showerror("Error", f"Invalid query: {e}")
+                    return
+                ast = None
+
+        if value.lower() == "all" or (live and not value):
+            rows = None
+            filter_key = None
+            self.last_filter = None
+        elif ast is not None:
+            filter_key = ("query", repr(ast))
+            self.last_filter = None
+        elif not column:
+            if not live:
+                messagebox.showerror("Error", "Please select a column.")
             return
-
-        if value.lower() == "all":
-            filtered_df = self.df.copy()
         else:
-            filtered_df = self.df[self.df[column].astype(str).str.contains(value, case=False, na=False)]
-
-        self.filtered_df = filtered_df
-
-        if filtered_df.empty:
+            needle = value.lower()
+            index = self.search_indexes.get(column)
+            if live and (index is None or not index.is_ready_for(needle)):
+                # Build the index off the Tk thread; the filter re-runs once it is ready
+                self.filter_status.config(text=f"Indexing '{column}'...")
+                self.build_search_index_async(column)
+                return
+            index = self.get_search_index(column)
+
+            # A query that extends the previous one can only match a subset of its values
+            within = None
+            if self.last_filter is not None:
+                last_column, last_needle, last_values = self.last_filter
+                if last_column == column and last_needle in needle:
+                    within = last_values
+            value_ids = index.matching_values(needle, within)
+            self.last_filter = (column, needle, value_ids)
+            rows = index.rows_for(value_ids)
+            filter_key = ("contains", column, needle)
+
+        # The result is a row selection over self.df; no rows are copied until they are displayed
+        self.filter_rows = rows
+        self.filter_key = filter_key
+        filtered = FrameView(self.df, rows)
+
+        self.filter_status.config(text="" if rows is None else f"{len(filtered):,} matching rows")
+        if live:
+            self.update_analysis_table(filtered)
+        elif len(filtered) == 0:
             messagebox.showinfo("No Results", "No matching data found.")
         else:
-            self.update_analysis_table(filtered_df)
+            self.update_analysis_table(filtered)
 
     def calculate_total(self):
+        # Opens the aggregation page with the selected column, totalled over the active filter
         if self.df is None:
             messagebox.showerror("Error", "No data loaded.")
             return
@@ -316,46 +2817,408 @@ class ExcelViewerApp:
             messagebox.showerror("Error", "Please select a column.")
             return
 
+        self.show_aggregate_page()
+        self.agg_value_var.set(column)
+        self.run_aggregation()
+
+    def get_key_codes(self, column):
+        codes = self.key_codes.get(column)
+        if codes is None:
+            codes = factorize_column(self.df[column])
+            self.key_codes[column] = codes
+        return codes
+
+    def get_group_keys(self, columns):
+        key = tuple(columns)
+        group_keys = self.group_keys.get(key)
+        if group_keys is None:
+            group_keys = GroupKeys(columns, [self.get_key_codes(col) for col in columns], len(self.df))
+            self.group_keys[key] = group_keys
+        return group_keys
+
+    def run_aggregation(self):
+        if self.df is None:
+            messagebox.showerror("Error", "No data loaded.")
+            return
+
+        group_cols = [self.group_by_listbox.get(i) for i in self.group_by_listbox.curselection()]
+        value_col = self.agg_value_var.get()
+        funcs = [func for func in AGGREGATES if self.agg_func_vars[func].get()]
+
+        if not value_col:
+            messagebox.showerror("Error", "Please select a value column.")
+            return
+        if not funcs:
+            messagebox.showerror("Error", "Please select at least one aggregate.")
+            return
+
+        def compute():
+            # The O(n) value conversion only runs on a cache miss
+            series = self.df[value_col]
+            if funcs == ["count"]:
+                # Counting works on any column; only non-empty cells count
+                values = np.where(series.notna().to_numpy(), 1.0, np.nan)
+            else:
+                values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                if np.isnan(values).all():
+                    raise ValueError("Selected column is not numeric.")
+            return self.get_group_keys(group_cols).aggregate(values, funcs, self.filter_rows)
+
         try:
-            total = self.df[column].sum()
-            messagebox.showinfo("Total", f"Total sum of '{column}': {total}")
-        except Exception:
-            messagebox.showerror("Error", "Selected column is not numeric.")
+            result = self.cached("aggregate", (tuple(group_cols), value_col, tuple(funcs), self.filter_key), compute)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to aggregate: {e}")
+            return
 
-    def generate_pie_chart(self):
-        col1 = self.col1_var.get()
-        col2 = self.col2_var.get()
+        result = result.rename(columns={func: f"{func}({value_col})" for func in funcs})
+        rows = len(self.df) if self.filter_rows is None else len(self.filter_rows)
+        self.aggregate_note.config(text=f"{len(result):,} groups over {rows:,} filtered rows")
+        self.aggregate_table.set_data(result)
+
+    def get_pivot_cube(self, keys, value_col):
+        # Reuses the current cube whenever it was built over a superset of the requested keys for
+        # the same data, value column and filter; otherwise aggregates the raw rows once
+        cube = self.pivot_cube
+        if (cube is not None and cube[:3] == (self.dataset_version, value_col, self.filter_key)
+                and set(keys) <= set(cube[3])):
+            return cube[4]
+
+        series = self.df[value_col]
+        values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        if np.isnan(values).all():
+            # Non-numeric value columns can still be counted
+            values = np.where(series.notna().to_numpy(), 1.0, np.nan)
+        cube_df = self.get_group_keys(keys).aggregate(values, CUBE_PARTIALS, self.filter_rows)
+        self.pivot_cube = (self.dataset_version, value_col, self.filter_key, tuple(keys), cube_df)
+        return cube_df
+
+    def build_pivot(self):
+        if self.df is None:
+            messagebox.showerror("Error", "No data loaded.")
+            return
+
+        row_keys = [self.pivot_rows_listbox.get(i) for i in self.pivot_rows_listbox.curselection()]
+        col_keys = [self.pivot_cols_listbox.get(i) for i in self.pivot_cols_listbox.curselection()]
+        value_col = self.pivot_value_var.get()
+        func = self.pivot_func_var.get()
+
+        if not value_col:
+            messagebox.showerror("Error", "Please select a value column.")
+            return
+        if set(row_keys) & set(col_keys):
+            messagebox.showerror("Error", "A column can't be both a row and a column key.")
+            return
 
         try:
-            df = self.df.copy()
-
-            if col1 and col2:
-                df["combined"] = df[col1].astype(str) + " - " + df[col2].astype(str)
-            elif col1:
-                df["combined"] = df[col1].astype(str)
-            elif col2:
-                df["combined"] = df[col2].astype(str)
-            else:
-                df["combined"] = "All Data"
+            cube = self.get_pivot_cube(row_keys + col_keys, value_col)
+            table = pivot_from_cube(cube, row_keys, col_keys, func)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to build pivot: {e}")
+            return
+
+        self.pivot_note.config(text=f"{func}({value_col}): {len(table):,} rows x {len(table.columns):,} columns, "
+                                    f"from a cube of {len(cube):,} cells")
+        self.pivot_table.set_data(table)
+
+    def transpose_pivot(self):
+        # Swaps row and column keys; the new pivot comes from the same cube
+        row_keys = [self.pivot_rows_listbox.get(i) for i in self.pivot_rows_listbox.curselection()]
+        col_keys = [self.pivot_cols_listbox.get(i) for i in self.pivot_cols_listbox.curselection()]
+        cols = list(self.pivot_rows_listbox.get(0, tk.END))
+        self.fill_listbox(self.pivot_rows_listbox, cols, col_keys)
+        self.fill_listbox(self.pivot_cols_listbox, cols, row_keys)
+        self.build_pivot()
 
-            pie_data = df["combined"].value_counts()
+    def chart_kind(self):
+        return next(kind for kind, name in CHART_TYPES.items() if name == self.chart_type_var.get())
 
-            fig, ax = plt.subplots(figsize=(6, 6))
-            ax.pie(pie_data, labels=pie_data.index, autopct="%1.1f%%", startangle=140, textprops={"fontsize": 8})
-            ax.set_title("Pie Chart")
+    def update_chart_hint(self):
+        self.chart_hint.config(text=CHART_HINTS[self.chart_kind()])
 
-            if self.chart_canvas:
-                self.chart_canvas.get_tk_widget().destroy()
+    def chart_settings(self):
+        # (chart kind, label columns, value column, top K) from the chart controls, or None after an
+        # error box
+        try:
+            top_k = int(self.top_k_var.get())
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "Top K must be a whole number.")
+            return None
+        label_cols = tuple(col for col in (self.col1_var.get(), self.col2_var.get()) if col)
+        return self.chart_kind(), label_cols, self.value_col_var.get(), min(max(top_k, 1), PIE_MAX_SLICES)
+
+    def generate_chart(self):
+        settings = self.chart_settings()
+        if settings is None:
+            return
 
-            self.chart_canvas = FigureCanvasTkAgg(fig, master=self.pie_chart_display)
-            self.chart_canvas.draw()
-            self.chart_canvas.get_tk_widget().pack()
+        try:
+            spec = self.cached("chart", settings, lambda: self.build_chart_spec(*settings))
+            if spec is None:
+                messagebox.showerror("Error", "Nothing to chart for these settings.")
+                return
 
-            fig.savefig("pie_chart_output.jpg")
+            self.chart_spec = spec
+            draw_chart(self.chart_panel.new_axes(), spec)
+            self.chart_panel.draw()
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to generate chart: {e}")
 
+    def chart_values(self, value_col, rows):
+        values = pd.to_numeric(self.df[value_col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        return values if rows is None else values[rows]
+
+    def build_chart_spec(self, kind, label_cols, value_col, top_k, rows=None, title=None):
+        # Reduces the rows (all of them, or the given positions) to what the chart draws: top-K
+        # totals, a count matrix, histogram bins, box stats or LTTB-decimated points.
+        # Returns None when nothing is left to draw; bad settings raise ValueError.
+        title = title or CHART_TYPES[kind]
+        if kind in ("hist", "box") and not value_col:
+            raise ValueError(f"{CHART_TYPES[kind]} needs a value column.")
+        if kind == "stacked" and len(label_cols) != 2:
+            raise ValueError("Stacked bars need both label columns.")
+        if kind == "line" and not label_cols:
+            raise ValueError("Line charts need a label column as the x axis.")
+
+        if kind in ("pie", "bar"):
+            group_keys = self.get_group_keys(label_cols)
+            group_ids = group_keys.group_ids if rows is None else group_keys.group_ids[rows]
+            weights = None
+            if value_col:
+                weights = self.chart_values(value_col, rows)
+                # Negative and missing values cannot be drawn as slices
+                weights = np.where(weights > 0, weights, 0.0) if kind == "pie" else np.nan_to_num(weights)
+            totals = np.bincount(group_ids, weights=weights, minlength=group_keys.group_count)
+            data = top_k_slices(totals, group_keys, top_k, positive_only=(kind == "pie"))
+
+        elif kind == "stacked":
+            (codes1, values1), (codes2, values2) = (self.get_key_codes(col) for col in label_cols)
+            if rows is not None:
+                codes1, codes2 = codes1[rows], codes2[rows]
+            weights = None if not value_col else np.nan_to_num(self.chart_values(value_col, rows))
+            # Code 0 is the missing-value bucket
+            size2 = len(values2) + 1
+            totals = np.bincount((codes1 + 1) * size2 + (codes2 + 1), weights=weights,
+                                 minlength=(len(values1) + 1) * size2).reshape(-1, size2)
+            data = top_k_matrix(totals, lambda i: "(blank)" if i == 0 else str(values1[i - 1]),
+                                lambda i: "(blank)" if i == 0 else str(values2[i - 1]), top_k)
+
+        elif kind == "hist":
+            values = self.chart_values(value_col, rows)
+            values = values[np.isfinite(values)]
+            if not len(values):
+                return None
+            data = np.histogram(values, bins=HISTOGRAM_BINS)
+
+        elif kind == "box":
+            values = self.chart_values(value_col, rows)
+            group_keys = self.get_group_keys(label_cols)
+            group_ids = group_keys.group_ids if rows is None else group_keys.group_ids[rows]
+            top, _, _ = top_k_indices(np.bincount(group_ids, minlength=group_keys.group_count), top_k)
+            data = [box_stats(values[group_ids == group], group_label(group_keys, group)) for group in top]
+            data = [stats for stats in data if stats is not None]
+
+        else:
+            x_series = self.df[label_cols[0]]
+            if pd.api.types.is_datetime64_any_dtype(x_series.dtype):
+                x = x_series.dt.tz_localize(None) if getattr(x_series.dt, "tz", None) else x_series
+                x = x.to_numpy(dtype="datetime64[ns]")
+            elif pd.api.types.is_numeric_dtype(x_series.dtype) and not pd.api.types.is_bool_dtype(x_series.dtype):
+                x = x_series.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                raise ValueError("Line charts need a date or numeric label column.")
+            if rows is not None:
+                x = x[rows]
+            data = line_points(x, self.chart_values(value_col, rows) if value_col else None)
+
+        if len(data[0] if kind in ("hist", "line") else data) == 0:
+            return None
+        return kind, data, title
+
+    def batch_chart_specs(self, batch_col, kind, label_cols, value_col, top_k):
+        # One chart per value of batch_col: rows are grouped once with a stable argsort on the
+        # cached codes and each group is reduced like a full chart
+        codes, values = self.get_key_codes(batch_col)
+        if not len(codes):
+            return []
+        order = np.argsort(codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+
+        specs = []
+        for rows in np.split(order, bounds):
+            code = codes[rows[0]]
+            group = "(blank)" if code < 0 else values[code]
+            spec = self.build_chart_spec(kind, label_cols, value_col, top_k, rows,
+                                         f"{CHART_TYPES[kind]} - {batch_col}: {group}")
+            if spec is not None:
+                specs.append((group, spec))
+        return specs
+
+    def browse_export_dir(self):
+        folder = filedialog.askdirectory(initialdir=self.export_dir_var.get() or None)
+        if folder:
+            self.export_dir_var.set(folder)
+
+    def export_chart(self):
+        if self.df is None:
+            messagebox.showerror("Error", "Please load an Excel file first.")
+            return
+        fmt = self.export_format_var.get()
+        folder = self.export_dir_var.get().strip()
+        template = self.export_template_var.get().strip() or EXPORT_TEMPLATE
+        batch_col = self.export_batch_var.get()
+        try:
+            dpi = int(self.export_dpi_var.get())
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "DPI must be a whole number.")
+            return
+        if not os.path.isdir(folder):
+            messagebox.showerror("Error", f"Export folder does not exist: {folder}")
+            return
+
+        if batch_col:
+            settings = self.chart_settings()
+            if settings is None:
+                return
+            try:
+                charts = self.batch_chart_specs(batch_col, *settings)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to prepare charts: {e}")
+                return
+            if not charts:
+                messagebox.showerror("Error", "Nothing to chart for these settings.")
+                return
+            if len(charts) > EXPORT_CONFIRM_CHARTS and not messagebox.askyesno(
+                    "Export", f"Export {len(charts):,} charts, one per value of {batch_col}?"):
+                return
+        elif self.chart_spec is not None:
+            charts = [(None, self.chart_spec)]
+        else:
+            messagebox.showerror("Error", "Show a chart first, or pick a column for one chart per value.")
+            return
+
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        taken = set()
+        try:
+            jobs = [(spec, unique_path(os.path.join(folder, export_filename(template, fmt, spec[0], timestamp, group)), taken))
+                    for group, spec in charts]
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        def done(paths):
+            self.export_button.config(state=tk.NORMAL)
+            saved = paths[0] if len(paths) == 1 else f"{len(paths):,} charts to {folder}"
+            self.export_status.config(text=f"Saved {saved}", fg="green")
+
+        def failed(e):
+            self.export_button.config(state=tk.NORMAL)
+            self.export_status.config(text="Export failed", fg="red")
+            messagebox.showerror("Error", f"Failed to export: {e}")
+
+        self.export_button.config(state=tk.DISABLED)
+        self.export_status.config(text=f"Exporting {len(jobs):,} chart(s)...", fg="black")
+        self.run_in_background(lambda: export_charts(jobs, dpi), done, failed)
+
+    def show_salary_totals(self, salary, salary_params, money):
+        counted = int(np.isfinite(salary).sum())
+        total, average = money([np.nansum(salary), np.nanmean(salary)]) if counted else ("", "")
+        changed = self.salary_run.changed_rows
+        note = f"    (recalculated {len(changed):,} changed rows)" if changed is not None and len(changed) else ""
+        self.salary_summary.config(text=f"Employees: {counted:,}    Total: {total}    Average: {average}{note}")
+
+        group_col = self.salary_group_var.get()
+        if not group_col:
+            self.salary_group_table.frame.pack_forget()
+            return
+
+        def group_totals():
+            result = self.get_group_keys([group_col]).aggregate(salary, ["count", "sum", "mean"])
+            return result.sort_values("sum", ascending=False, ignore_index=True)
+
+        result = self.cached("salary_groups", salary_params + (group_col,), group_totals)
+        result = result.rename(columns={"count": "Employees", "sum": "Total", "mean": "Average"})
+        self.salary_group_table.pack(fill=tk.X)
+        self.salary_group_table.set_data(FrameView(result, formatters={"Total": money, "Average": money}))
+
+    def load_payroll_rules(self):
+        path = filedialog.askopenfilename(filetypes=[("Payroll rules", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            self.payroll_rules = PayrollRules.from_file(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to load payroll rules: {e}")
+            return
+        self.rules_label.config(text=self.payroll_rules.name, fg="black")
+
+    def clear_payroll_rules(self):
+        self.payroll_rules = None
+        self.rules_label.config(text="None", fg="gray")
+
+    def load_rate_table(self):
+        path = filedialog.askopenfilename(filetypes=[("Exchange rates", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            self.rate_table = RateTable.from_file(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to load exchange rates: {e}")
+            return
+        self.rates_label.config(text=self.rate_table.name, fg="black")
+        self.currency_dropdown["values"] = sorted(set(DEFAULT_CURRENCIES) | set(self.rate_table.currencies))
+
+    def clear_rate_table(self):
+        self.rate_table = None
+        self.rates_label.config(text="None", fg="gray")
+        self.currency_dropdown["values"] = DEFAULT_CURRENCIES
+
+    def load_holidays(self):
+        path = filedialog.askopenfilename(filetypes=[("Holiday calendar", "*.csv *.txt"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            holidays = load_holidays(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Failed to load holidays: {e}")
+            return
+        self.holidays = (hashlib.sha1(holidays.tobytes()).hexdigest(), holidays)
+        self.holidays_label.config(text=f"{os.path.basename(path)} ({len(holidays):,} days)", fg="black")
+
+    def clear_holidays(self):
+        self.holidays = None
+        self.holidays_label.config(text="None", fg="gray")
+
+    def salary_proration(self):
+        # (key, factors) for monthly pay from the start/end date columns, or None without either
+        start_col, end_col = self.start_date_col_var.get(), self.end_date_col_var.get()
+        if not start_col and not end_col:
+            return None
+        period_text = self.pay_period_var.get()
+        period = pay_period(period_text)
+        holidays_key, holidays = self.holidays if self.holidays else (None, None)
+
+        def dates(col):
+            if not col:
+                return None
+            return pd.to_datetime(self.df[col], errors="coerce").to_numpy(dtype="datetime64[ns]")
+
+        key = (start_col, end_col, period_text.strip(), holidays_key)
+        factors = self.cached("proration", key,
+                              lambda: proration_factors(dates(start_col), dates(end_col), period, holidays))
+        return key, factors
+
+    def currency_factors(self, currency_col, date_col, target):
+        # Per-row conversion factors into target, memoized per dataset version, columns and rates
+        def compute():
+            codes, uniques = self.get_key_codes(currency_col)
+            dates = None
+            if date_col:
+                dates = pd.to_datetime(self.df[date_col], errors="coerce").to_numpy(dtype="datetime64[ns]")
+            return self.rate_table.factors(codes, uniques, dates, target)
+
+        return self.cached("fx_factors", (currency_col, date_col, self.rate_table.key, target), compute)
+
     def calculate_salary(self):
         if self.df is None:
             messagebox.showerror("Error", "Please load data first.")
@@ -367,54 +3230,202 @@ class ExcelViewerApp:
             salary_type = self.salary_type_var.get()
             currency = self.currency_var.get()
 
-            df = self.df.copy()
-
-            # Ensure that the work hours and rate columns are numeric
-            df[work_col] = pd.to_numeric(df[work_col], errors='coerce', downcast='float')
-            df[rate_col] = pd.to_numeric(df[rate_col], errors='coerce', downcast='float')
-
-            # Validate that work hours and rate columns are numeric
-            if df[work_col].isnull().any() or df[rate_col].isnull().any():
-                messagebox.showerror("Error", "Work hours and rate columns must contain numeric values.")
+            # Apply salary calculation based on type; the result is a side array, not a new column.
+            # SalaryRun only recomputes what the changed inputs affect (see its comment).
+            try:
+                proration = self.salary_proration() if salary_type == "monthly" else None
+                components = dict(self.salary_run.update(self.df, self.dataset_version, work_col, rate_col,
+                                                         salary_type, self.payroll_rules, proration))
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
-
-            # Reset the salary treeview
-            self.salary_tree["columns"] = []
-            self.salary_tree.delete(*self.salary_tree.get_children())
-
-            # Apply salary calculation based on type
-            if salary_type == "daily":
-                df["Salary"] = df[work_col] * df[rate_col]
-            elif salary_type == "monthly":
-                df["Salary"] = df[rate_col]
-            else:  # hourly
-                df["Salary"] = df[work_col] * df[rate_col]
+            salary = components.pop("Net")
+            salary_params = ("run", self.salary_run.revision)
+
+            # Convert every row from its pay currency in one pass; rows without a rate become blank
+            currency_col = self.pay_currency_col_var.get()
+            missing_rates = 0
+            if currency_col and self.rate_table is not None:
+                factors = self.currency_factors(currency_col, self.rate_date_col_var.get(), currency)
+                salary = salary * factors
+                components = {name: values * factors for name, values in components.items()}
+                salary_params += (currency_col, self.rate_date_col_var.get(), self.rate_table.key, currency)
+                missing_rates = int(np.isnan(factors).sum())
+            elif currency_col:
+                messagebox.showwarning("Warning", "Load an exchange rate file to convert pay currencies.")
+            self.salary_values = salary
 
             # Add the salary label with currency
             salary_label = f"Salary ({currency})"
-            df[salary_label] = df["Salary"]
-
-            # Format the salary
-            df[salary_label] = df[salary_label].apply(lambda x: f"{currency} {x:,.2f}")
-
-            selected_cols = [var.get() for var in self.result_col_vars if var.get() in df.columns]
-            selected_cols += [salary_label]
-
-            display_df = df[selected_cols]
-
-            # Update the salary treeview
-            self.salary_tree["columns"] = list(display_df.columns)
-            for col in display_df.columns:
-                self.salary_tree.heading(col, text=col)
-                self.salary_tree.column(col, anchor="center", width=150)
-            for _, row in display_df.iterrows():
-                self.salary_tree.insert("", tk.END, values=list(row))
+            money = money_formatter(currency)
+
+            selected_cols = [var.get() for var in self.result_col_vars if var.get() in self.df.columns]
+
+            # Update the salary table; a view over self.df plus the numeric salary side column,
+            # of which only the visible rows are materialized and formatted
+            extra = {f"{name} ({currency})": values for name, values in components.items()}
+            extra[salary_label] = salary
+            # Same columns keep their Tk items and scroll position, so only changed cells are redrawn
+            self.salary_table.set_data(FrameView(self.df, columns=selected_cols, extra=extra,
+                                                 formatters={label: money for label in extra}),
+                                       keep_position=True)
+            self.show_salary_totals(salary, salary_params, money)
+            if missing_rates:
+                messagebox.showwarning("Warning", f"{missing_rates:,} row(s) have no exchange rate for their "
+                                                  f"currency and date; they are left blank and out of the totals.")
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to calculate salary: {e}")
 
 
+# Headless payroll runs, e.g.
+#   python excelReaderV4_hr_AI.py payroll branches/ --work-col Hours --rate-col Rate --rules rules.json
+PAYROLL_FORMATS = ["xlsx", "csv"]
+
+
+def payroll_columns(df, options, rules=None, rates=None):
+    # Salary columns for one DataFrame, built from the same pieces as the Salary page
+    work, rate = salary_inputs(df, options["work_col"], options["rate_col"])
+    if options["salary_type"] == "monthly" and (options["start_col"] or options["end_col"]):
+        holidays = load_holidays(options["holidays"]) if options["holidays"] else None
+        dates = [None if not col else pd.to_datetime(df[col], errors="coerce").to_numpy(dtype="datetime64[ns]")
+                 for col in (options["start_col"], options["end_col"])]
+        rate = rate * proration_factors(*dates, pay_period(options["period"]), holidays)
+    components = pay_components(work, rate, options["salary_type"], rules)
+    components["Salary"] = components.pop("Net")
+
+    if rates is not None:
+        codes, uniques = factorize_column(df[options["currency_col"]])
+        dates = None
+        if options["date_col"]:
+            dates = pd.to_datetime(df[options["date_col"]], errors="coerce").to_numpy(dtype="datetime64[ns]")
+        factors = rates.factors(codes, uniques, dates, options["currency"])
+        components = {name: values * factors for name, values in components.items()}
+    return {f"{name} ({options['currency']})": values for name, values in components.items()}
+
+
+def run_payroll_file(path, output, options):
+    # One workbook end to end; top-level so it can run in a process pool worker. Rule and rate
+    # files are re-read here because compiled rules don't pickle. Never raises: failures are
+    # reported in the returned summary.
+    start = time.perf_counter()
+    summary = {"input": path, "output": output, "rows": 0, "total": 0.0, "missing": 0, "error": None}
+    try:
+        sheets = list_sheets(path) if options["all_sheets"] else [0]
+        if len(sheets) == 1:
+            df = parse_sheet(path, sheets[0])
+        else:
+            df = pd.concat([parse_sheet(path, sheet).assign(**{SOURCE_COLUMN: source_label(path, sheet)})
+                            for sheet in sheets], ignore_index=True)
+            df = df[[SOURCE_COLUMN] + [col for col in df.columns if col != SOURCE_COLUMN]]
+
+        rules = PayrollRules.from_file(options["rules"]) if options["rules"] else None
+        rates = RateTable.from_file(options["rates"]) if options["rates"] else None
+        columns = payroll_columns(df, options, rules, rates)
+        salary = columns[f"Salary ({options['currency']})"]
+
+        # Amounts are written to the cent; the summary total is taken before rounding
+        result = df.assign(**{name: np.round(values, 2) for name, values in columns.items()})
+        if options["format"] == "csv":
+            result.to_csv(output, index=False)
+        else:
+            result.to_excel(output, index=False)
+        summary.update(rows=len(df), total=float(np.nansum(salary)), missing=int(np.isnan(salary).sum()))
+    except Exception as e:
+        summary["error"] = f"{type(e).__name__}: {e}"
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def print_payroll_summary(summary, currency):
+    name = os.path.basename(summary["input"])
+    if summary["error"]:
+        print(f"FAIL  {name}  {summary['seconds']:.2f}s  {summary['error']}", flush=True)
+        return
+    missing = f"  ({summary['missing']:,} rows without a rate)" if summary["missing"] else ""
+    print(f"ok    {name}  {summary['rows']:,} rows  {currency} {summary['total']:,.2f}  "
+          f"{summary['seconds']:.2f}s -> {summary['output']}{missing}", flush=True)
+
+
+def run_payroll_cli(argv):
+    parser = argparse.ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} payroll",
+                                     description="Calculate payroll for workbooks without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="workbooks or folders of workbooks")
+    parser.add_argument("--work-col", required=True, help="work hours (or days) column")
+    parser.add_argument("--rate-col", required=True, help="pay rate column")
+    parser.add_argument("--salary-type", choices=SALARY_TYPES, default="hourly")
+    parser.add_argument("--currency", default="MYR", help="currency of the results")
+    parser.add_argument("--rules", help="payroll rule file (JSON)")
+    parser.add_argument("--rates", help="exchange rate file (CSV with currency, date, rate)")
+    parser.add_argument("--currency-col", help="column with each row's pay currency (needs --rates)")
+    parser.add_argument("--date-col", help="column with each row's date for exchange rates")
+    parser.add_argument("--start-col", help="employment start date column (monthly proration)")
+    parser.add_argument("--end-col", help="employment end date column (monthly proration)")
+    parser.add_argument("--period", default=time.strftime("%Y-%m"), help="pay period as YYYY-MM")
+    parser.add_argument("--holidays", help="holiday calendar file (one date per line)")
+    parser.add_argument("--all-sheets", action="store_true", help="process every sheet of each workbook")
+    parser.add_argument("--output-dir", default="payroll_output")
+    parser.add_argument("--format", choices=PAYROLL_FORMATS, default="xlsx")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    if bool(args.rates) != bool(args.currency_col):
+        parser.error("--rates and --currency-col must be given together")
+    # Fail on a bad rule or rate file once, before any worker starts
+    try:
+        if args.rules:
+            PayrollRules.from_file(args.rules)
+        if args.rates:
+            RateTable.from_file(args.rates)
+        if args.holidays:
+            load_holidays(args.holidays)
+        pay_period(args.period)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    paths = []
+    for path in args.inputs:
+        if not os.path.exists(path):
+            parser.error(f"no such file or folder: {path}")
+        paths.extend(list_workbooks(path) if os.path.isdir(path) else [path])
+    if not paths:
+        parser.error("no workbooks found")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    taken = set()
+    outputs = [unique_path(os.path.join(args.output_dir, f"{os.path.splitext(os.path.basename(path))[0]}_payroll.{args.format}"), taken)
+               for path in paths]
+    options = {"work_col": args.work_col, "rate_col": args.rate_col, "salary_type": args.salary_type,
+               "currency": args.currency, "rules": args.rules, "rates": args.rates,
+               "currency_col": args.currency_col, "date_col": args.date_col,
+               "start_col": args.start_col, "end_col": args.end_col, "period": args.period,
+               "holidays": args.holidays,
+               "all_sheets": args.all_sheets, "format": args.format}
+
+    start = time.perf_counter()
+    summaries = []
+    if len(paths) == 1:
+        summaries.append(run_payroll_file(paths[0], outputs[0], options))
+        print_payroll_summary(summaries[0], args.currency)
+    else:
+        workers = min(len(paths), args.workers or os.cpu_count() or 1)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_payroll_file, path, output, options) for path, output in zip(paths, outputs)]
+            for future in concurrent.futures.as_completed(futures):
+                summaries.append(future.result())
+                print_payroll_summary(summaries[-1], args.currency)
+
+    done = [summary for summary in summaries if not summary["error"]]
+    rows = sum(summary["rows"] for summary in done)
+    total = sum(summary["total"] for summary in done)
+    print(f"\n{len(done)} of {len(summaries)} workbook(s), {rows:,} rows, total {args.currency} {total:,.2f} "
+          f"in {time.perf_counter() - start:.1f}s")
+    return 0 if len(done) == len(summaries) else 1
+
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "payroll":
+        sys.exit(run_payroll_cli(sys.argv[2:]))
     root = tk.Tk()
     app = ExcelViewerApp(root)
     root.mainloop()